@@ -1,12 +1,12 @@
 from abc import ABC, abstractmethod
 from typing import Iterator
-from requests import Response, Session
+from requests import Response
 from requests.exceptions import HTTPError
 import pandas as pd
-import random
-import time
+import warnings
 
-from config.settings import USER_AGENT
+from util.http_utils import get_session
+from util.numeric import decode_numeric
 from util.proxy_utils import get_random_proxy
 
 class BaseScraper(ABC):
@@ -14,25 +14,35 @@ class BaseScraper(ABC):
     Base class for all scrapers.
     All subclasses must implement `.run()` method.
     """
+    # request budget of one `.run()`, used by the dry-run planner (tasks/planner.py)
+    _requests_per_run: dict[str, int] = {} # host key (see util/http_utils.py) -> number of requests
+    _parallel_requests: int = 1 # requests one `.run()` keeps in flight
+
+    @classmethod
+    def plan_requests(cls) -> dict[str, int]:
+        """
+        Number of requests per host key issued by one `.run()`, without sending any.
+        """
+        return dict(cls._requests_per_run)
+
     @abstractmethod
     def run(self) -> pd.DataFrame:
         pass
 
     @property
     def session(self):
-        if not hasattr(self, '_session'):
-            s = Session()
-            s.headers.update({"user-agent": USER_AGENT})
-            self._session = s
-        return self._session
+        return get_session()
 
     @property
     def proxy(self) -> dict | None:
-        """Return a proxy dict, or None if not needed."""
+        """
+        Return a proxy dict from the scored proxy pool, or None if none is available.
+        Pass it as `self.session.get(..., proxies=self.proxy)`: the session reports the outcome back to the pool.
+        """
         try:
             proxy = get_random_proxy()
             print(f'\nUsing Proxy {proxy}')
-            return {"https": proxy}
+            return {"http": proxy, "https": proxy}
         except Exception:
             return None
 
@@ -46,17 +56,18 @@ class BaseScraper(ABC):
     @staticmethod
     def parse_comma(df: pd.DataFrame):
         return df.astype(str).apply(lambda col: col.str.replace(",", ""))
-    
-    @staticmethod
-    def to_numeric(df: pd.DataFrame):
-        return df.apply(pd.to_numeric, errors='coerce')
-    
+
     @staticmethod
-    def respect_rate_limit(delay = 2., random_wait = True):
-        if random_wait:
-            time.sleep(delay + 0.1*random.randint(1,10))
-        else:
-            time.sleep(delay)
+    def parse_numeric(df: pd.DataFrame, dtypes: dict[str, str]) -> pd.DataFrame:
+        """
+        Decode the numeric text columns of `df` into `dtypes` (e.g. `ModelFrameMapper(model).pandas_dtypes`),
+        see util/numeric.py. Values that are neither numbers nor sentinels (`--`, `X`, blanks) become missing, with a warning.
+        """
+        df, unparseable = decode_numeric(df, dtypes)
+        unparseable = {col: n for col, n in unparseable.items() if n}
+        if unparseable:
+            warnings.warn(f'unparseable numeric values: {unparseable}')
+        return df
     
     @staticmethod
     def safe_concat(dfs: list[pd.DataFrame], col_names: list[str] = None) -> pd.DataFrame:
@@ -80,9 +91,12 @@ class OneTimeScraper(BaseScraper):
 class DailyScraper(BaseScraper):
     """
     For scrapers that take a single `date` (typically daily).
+    Extraction errors that are swallowed to keep the rest of the date are recorded in `errors`,
+    so the task runner can journal the date as failed and retry it.
     """
     def __init__(self, date: pd.Timestamp):
         self.date = date
+        self.errors: list[str] = []
 
 
 class PeriodicScraper(BaseScraper):
@@ -102,6 +116,25 @@ class BaseChunkScraper(ABC):
     def __init__(self, start_date: pd.Timestamp):
         self.start_date = start_date
 
+    # request budget of one chunk, used by the dry-run planner (tasks/planner.py)
+    _requests_per_run: dict[str, int] = {} # host key (see util/http_utils.py) -> number of requests
+    _parallel_requests: int = 1 # requests one chunk keeps in flight
+
+    @classmethod
+    def plan_requests(cls) -> dict[str, int]:
+        """
+        Number of requests per host key issued per chunk, without sending any.
+        """
+        return dict(cls._requests_per_run)
+
+    @classmethod
+    @abstractmethod
+    def plan_chunks(cls, start_date: pd.Timestamp) -> int:
+        """
+        Number of chunks `.run()` yields from `start_date`, used by the `--plan` dry run.
+        """
+        pass
+
     @abstractmethod
     def run(self) -> Iterator[pd.DataFrame]:
         """
@@ -111,11 +144,7 @@ class BaseChunkScraper(ABC):
 
     @property
     def session(self):
-        if not hasattr(self, '_session'):
-            s = Session()
-            s.headers.update({"user-agent": USER_AGENT})
-            self._session = s
-        return self._session
+        return get_session()
 
     @staticmethod
     def validate_response(response: Response):
@@ -127,17 +156,18 @@ class BaseChunkScraper(ABC):
     @staticmethod
     def parse_comma(df: pd.DataFrame):
         return df.astype(str).apply(lambda col: col.str.replace(",", ""))
-    
-    @staticmethod
-    def to_numeric(df: pd.DataFrame):
-        return df.apply(pd.to_numeric, errors='coerce')
-    
+
     @staticmethod
-    def respect_rate_limit(delay=2.0, random_wait=True):
-        if random_wait:
-            time.sleep(delay + 0.1 * random.randint(1, 10))
-        else:
-            time.sleep(delay)
+    def parse_numeric(df: pd.DataFrame, dtypes: dict[str, str]) -> pd.DataFrame:
+        """
+        Decode the numeric text columns of `df` into `dtypes` (e.g. `ModelFrameMapper(model).pandas_dtypes`),
+        see util/numeric.py. Values that are neither numbers nor sentinels (`--`, `X`, blanks) become missing, with a warning.
+        """
+        df, unparseable = decode_numeric(df, dtypes)
+        unparseable = {col: n for col, n in unparseable.items() if n}
+        if unparseable:
+            warnings.warn(f'unparseable numeric values: {unparseable}')
+        return df
 
 
 class DateChunkScraper(BaseChunkScraper):
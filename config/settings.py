@@ -15,6 +15,10 @@ DB_NAME = os.getenv("DB_NAME")
 SQLALCHEMY_DATABASE_URL = f"postgresql+psycopg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 DB_DSN = f"dbname={DB_NAME} user={DB_USER} password={DB_PASSWORD} host={DB_HOST} port={DB_PORT}"
 
+# shared by the psycopg pool and the SQLAlchemy engine, see util/db_pool.py
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 1))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 8))
+
 # === Default Start Dates ===
 """
     ✅ Only "IndexPrice" is recommended to be changed by the user.
@@ -33,10 +37,90 @@ DEFAULT_START_DATES = {
     "StockCapReduction": pd.Timestamp("2011-01-01") # twse
 }
 
+# === Table Partitioning ===
+"""
+    Tables listed here are created as range-partitioned tables on `date`, with one partition per
+    "year" or "month". Partitions are created ahead of ingestion by the task runners, and existing
+    plain tables can be migrated with `python -m tasks.create_tables --migrate-partitions`.
+"""
+PARTITIONED_TABLES = {
+    "stock_price": "year",
+    "stock_ii": "year",
+    "broker_transaction": "month",
+}
+PARTITION_PREMAKE = 1 # number of partitions created ahead of the current period
+
+# === Per-host Request Limits ===
+# max in-flight requests per data provider, shared by all scrapers in the process (see util/http_utils.py)
+HOST_MAX_CONCURRENCY = {
+    "twse.com.tw": 2,
+    "tpex.org.tw": 2,
+    "taifex.com.tw": 2,
+    "fubon-ebrokerdj.fbs.com.tw": 32,
+}
+DEFAULT_HOST_MAX_CONCURRENCY = 4
+
+# === Host Rate Limits ===
+# token bucket per data provider, shared by all scrapers in the process (see util/http_utils.py):
+# `rate` requests per second on average, with bursts of up to `burst` requests after an idle period
+HOST_RATE_LIMITS = {
+    "twse.com.tw": {"rate": 0.5, "burst": 3},
+    "tpex.org.tw": {"rate": 1, "burst": 3},
+    "taifex.com.tw": {"rate": 1, "burst": 3},
+    "fubon-ebrokerdj.fbs.com.tw": {"rate": 20, "burst": 32},
+}
+DEFAULT_HOST_RATE_LIMIT = {"rate": 2, "burst": 4}
+PLAN_REQUEST_LATENCY = 0.5 # response time of one request assumed by the dry-run planner (python main.py --plan), in seconds
+
+# === Raw Response Cache ===
+# "off", "record" (download and cache responses) or "replay" (serve cached responses only), see util/response_cache.py
+HTTP_CACHE_MODE = os.getenv("HTTP_CACHE_MODE", "off")
+HTTP_CACHE_DIR = os.getenv("HTTP_CACHE_DIR", ".http_cache")
+
+# === Proxy Pool ===
+# scored proxies persisted across runs, see util/proxy_utils.py
+PROXY_POOL_PATH = os.getenv("PROXY_POOL_PATH", ".proxy_pool.json")
+PROXY_LIST_FILE = os.getenv("PROXY_LIST_FILE") # local proxy list (one host:port per line) used instead of sslproxies.org
+PROXY_TEST_URL = "https://www.twse.com.tw/"
+PROXY_MAX_FAILURES = 3 # consecutive failures before a proxy is evicted
+PROXY_MIN_POOL = 5 # refill from the source below this many proxies
+PROXY_REVALIDATE_SECONDS = 600 # interval of the background revalidation
+PROXY_REFILL_SECONDS = 300 # minimum interval between two refills from the source
+PROXY_REJECT_SECONDS = 3600 # proxies failing validation or evicted are not retested for this long
+
+# === Fetch/Parse Stages ===
+# page-heavy scrapers fetch on threads and parse on a process pool, see util/parse_pool.py
+FETCH_WORKERS = 32 # fetch threads per scraper run (in-flight requests are still bounded per host)
+PARSE_POOL_SIZE = int(os.getenv("PARSE_POOL_SIZE", os.cpu_count() or 1)) # parse processes shared by all scrapers
+
+# === Async Fetch Engine ===
+# asyncio fetching of BrokerTransaction broker pages, with AIMD-adapted concurrency per host (see util/async_fetch.py)
+ASYNC_FETCH_CONCURRENCY = {"initial": 8, "min": 2, "max": 64} # "max" is further capped by HOST_MAX_CONCURRENCY
+ASYNC_FETCH_LATENCY_TARGET = 2.0 # seconds; slower responses count as congestion
+ASYNC_FETCH_MAX_ATTEMPTS = 4 # attempts per page on throttling (429/503), server errors (RETRY_STATUS) or connection errors
+ASYNC_FETCH_TIMEOUT = 30 # seconds
+
+# === Background Writer ===
+WRITER_MAX_PENDING = 4 # frames queued before the scraping loop blocks
+WRITER_MAX_BATCH_ROWS = 500_000 # max rows coalesced into one COPY transaction
+
+# === Checkpoint Journal ===
+# units failing this many times are reported but no longer retried by the task runners, see util/journal.py
+JOURNAL_MAX_ATTEMPTS = 5
+
+# === Analytical Mirror ===
+# directory of the local Parquet mirror refreshed after each task (disabled if unset), see util/mirror.py
+MIRROR_DIR = os.getenv("MIRROR_DIR")
+
 # === Routine Configuration ===
 with open("config/routine.yaml", "r") as f:
     ROUTINE_CONFIG = yaml.safe_load(f)
 
 # === Retry Settings ===
+# request-level retries of the shared session, with jittered exponential backoff (see util/http_utils.py)
 RETRY_MAX_ATTEMPTS = 3
-RETRY_WAIT_SECONDS = 1
+RETRY_WAIT_SECONDS = 1 # backoff base: attempt n waits up to RETRY_WAIT_SECONDS * 2 ** (n - 1)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+HTTP_TIMEOUT = 30 # seconds, default timeout of scraper requests
+# a host failing `failures` requests in a row is skipped for `cooldown` seconds, then probed with one request
+CIRCUIT_BREAKER = {"failures": 5, "cooldown": 60}
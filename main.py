@@ -1,7 +1,10 @@
 import argparse
+from contextlib import nullcontext
 from config.settings import ROUTINE_CONFIG
 from util.db_utils import table_has_data
-from tasks import run_task, create_tables
+from tasks import run_task, run_gap_fill_task, report_run_stats, create_tables, deferred_indexes
+from tasks.scheduler import run_models
+from tasks.planner import plan_models
 from models import get_model
 from base_class.base_scraper import OneTimeScraper
 
@@ -30,30 +33,87 @@ def main():
         help=f"Run a specific model by name (available: {', '.join(all_models)})"
     )
 
+    parser.add_argument(
+        "-w", "--workers",
+        type=int,
+        default=1,
+        help="Number of dates scraped concurrently by daily tasks, shared by the models run at once with --jobs (default: 1)"
+    )
+
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=1,
+        help="Number of models run concurrently once their dependencies are done (default: 1)"
+    )
+
+    parser.add_argument(
+        "--fill-gaps",
+        action="store_true",
+        help="Instead of scraping new dates, rescrape the trading dates missing from daily tables"
+    )
+
+    parser.add_argument(
+        "--min-row-ratio",
+        type=float,
+        help="With --fill-gaps, also rescrape dates with fewer rows than this fraction of the typical row count (e.g. 0.8)"
+    )
+
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="Print the requests per host and estimated wall time of each task without scraping anything"
+    )
+
+    parser.add_argument(
+        "--defer-indexes",
+        action="store_true",
+        help="Drop secondary indexes before each task and rebuild them after it (for large backfills)"
+    )
+
     args = parser.parse_args()
 
-    create_tables()
+    if not args.plan: # a dry run does not touch the schema or the indexes
+        create_tables()
+
+    def run(model, workers: int = args.workers):
+        with deferred_indexes(model) if args.defer_indexes else nullcontext():
+            if args.fill_gaps:
+                run_gap_fill_task(model, workers=workers, min_row_ratio=args.min_row_ratio)
+            else:
+                run_task(model, workers=workers)
 
     if args.model:
-        model = get_model(args.model)
-        run_task(model)
-        return
+        models = [get_model(args.model)]
+    else:
+        routine_key = args.routine
+        if routine_key not in ROUTINE_CONFIG:
+            raise ValueError(f"Routine '{routine_key}' not found in routine.yaml")
+
+        models = []
+        for model_name in ROUTINE_CONFIG[routine_key]:
+            model = get_model(model_name)
 
-    routine_key = args.routine
-    if routine_key not in ROUTINE_CONFIG:
-        raise ValueError(f"Routine '{routine_key}' not found in routine.yaml")
+            if (not args.include_onetime
+                and issubclass(model._scraper, OneTimeScraper)
+                and table_has_data(model.__tablename__)
+                ):
+                print(f"Skipping OneTimeScraper (already has data): {model_name}")
+                continue
 
-    for model_name in ROUTINE_CONFIG[routine_key]:
-        model = get_model(model_name)
+            models.append(model)
 
-        if (not args.include_onetime
-            and issubclass(model._scraper, OneTimeScraper)
-            and table_has_data(model.__tablename__)
-            ):
-            print(f"Skipping OneTimeScraper (already has data): {model_name}")
-            continue
+    if args.plan:
+        plan_models(models, workers=args.workers, fill_gaps=args.fill_gaps, min_row_ratio=args.min_row_ratio)
+        return
 
-        run_task(model)
+    try:
+        if args.model:
+            run(models[0])
+        else:
+            run_models(models, jobs=args.jobs, workers=args.workers, run=run)
+    finally:
+        report_run_stats()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
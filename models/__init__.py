@@ -11,6 +11,7 @@ from models.stock_price import StockPrice
 from models.stock_split import StockSplit
 from models.stock_revenue import StockRevenue
 from models.stock_ii import StockII
+from models.ingestion_catalog import IngestionWatermark, IngestionDate, IngestionJournal
 from models.base import Base
 
 from typing import Type
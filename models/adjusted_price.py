@@ -1,5 +1,5 @@
 import pandas as pd
-from sqlalchemy import Column, DateTime, String, REAL
+from sqlalchemy import Column, DateTime, String, REAL, Index
 
 from base_class.base_transformer import Transformer
 from models.base import Base
@@ -50,8 +50,12 @@ class AdjustedPriceTransformer(Transformer):
 
 class AdjustedPrice(Base):
     __tablename__ = 'adjusted_price'
+    __table_args__ = (
+        Index("ix_adjusted_price_stock_id_date", "stock_id", "date"),
+    )
     # Although this is a transformer, we use `_scraper` here to integrate with the task pipeline
     _scraper = AdjustedPriceTransformer
+    _depends_on = ["IndexPrice", "StockPrice", "StockDividend", "StockCapReduction", "StockSplit"]
 
     date = Column(DateTime, primary_key=True, nullable=False)
     stock_id = Column(String(8), primary_key=True, nullable=False)
@@ -6,6 +6,7 @@ from base_class.base_scraper import OneTimeScraper
 from models.base import Base
 
 class BrokerInfoScraper(OneTimeScraper):
+    _requests_per_run = {"fubon-ebrokerdj.fbs.com.tw": 1}
 
     @staticmethod
     def parse_broker_id(broker_id_hash: str) -> str:
@@ -42,6 +43,7 @@ class BrokerInfoScraper(OneTimeScraper):
 class BrokerInfo(Base):
     __tablename__ = 'broker_info'
     _scraper = BrokerInfoScraper
+    _depends_on = ["IndexPrice"]
 
     broker_id = Column(String(4), primary_key=True, nullable=False)
     broker_name = Column(String(16), nullable=False)
@@ -1,15 +1,40 @@
 import pandas as pd
-from sqlalchemy import Column, DateTime, String, BigInteger
-from io import StringIO
-from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import Column, DateTime, String, BigInteger, Index
 
 from base_class.base_scraper import DailyScraper
+from config.settings import ASYNC_FETCH_CONCURRENCY, HOST_MAX_CONCURRENCY
 from util.db_utils import table_has_data, read_sql_fast
+from util.parse_pool import decode_content
+from util.async_fetch import async_fetcher
+from util.html_extract import extract_broker_rows
 from models.broker_info import BrokerInfoScraper
 from models.base import Base
 
 
+def _parse_broker_page(content: bytes, encoding: str | None, broker_id: str, url: str) -> tuple[dict[str, list], str | None]:
+    """
+    Parse stage of `BrokerTransactionScraper`, run in the parse pool: the column lists of one broker page
+    (see `extract_broker_rows`), and the extraction error if the page cannot be parsed.
+    """
+    try:
+        columns = extract_broker_rows(decode_content(content, encoding))
+        columns["broker_id"] = [broker_id] * len(columns["stock_id"])
+        return columns, None
+
+    except Exception as e:
+        return {}, f"{url}: {e!r}"
+
+
 class BrokerTransactionScraper(DailyScraper):
+    _requests_per_run = {"fubon-ebrokerdj.fbs.com.tw": 900} # one per broker, estimate used while broker_info is empty
+    _parallel_requests = min(ASYNC_FETCH_CONCURRENCY["max"], HOST_MAX_CONCURRENCY["fubon-ebrokerdj.fbs.com.tw"])
+
+    @classmethod
+    def plan_requests(cls) -> dict[str, int]:
+        if not table_has_data('broker_info'):
+            return super().plan_requests()
+        n_brokers = read_sql_fast("SELECT count(*) AS n FROM broker_info")["n"].iloc[0]
+        return {"fubon-ebrokerdj.fbs.com.tw": int(n_brokers)}
 
     def __init__(self, date: pd.Timestamp):
         super().__init__(date)
@@ -21,59 +46,46 @@ class BrokerTransactionScraper(DailyScraper):
         self.date_str = self.date.strftime("%Y-%m-%d")
         self.__columns = ["date","stock_id","broker_id","volume","turnover"]
     
-    def _scrape_broker(self, broker_id: str):
-        response = self.session.get("https://fubon-ebrokerdj.fbs.com.tw/z/zg/zgb/zgb0.djhtm",
-                                params={
-                                    "a":self.broker_info.loc[broker_id, "broker_group_query_str"],
-                                    "b":self.broker_info.loc[broker_id, "broker_query_str"],
-                                    "c":"B",
-                                    "e":self.date_str,
-                                    "f":self.date_str
-                                })
-        self.validate_response(response)
-        
-        try:
-            dfs = pd.read_html(StringIO(response.text), extract_links="all", attrs={"class":"t0"}, skiprows = 1)
-            df_buy = dfs[0].drop(0)
-            df_sell = dfs[1].drop(0)
-            df = pd.concat([df_buy, df_sell.iloc[::-1]], ignore_index=True)
-            no_data_flag = ("無此券商分點交易資料", None)
-            if df.iloc[0, 0] == no_data_flag:
-                df = pd.DataFrame(columns = range(4))
-            df["broker_id"] = broker_id
-            return df
-        
-        except Exception as e:
-            print(f"Extraction Error occurs at {response.url}")
-            print(e)
-            return pd.DataFrame(columns=self.__columns)
+    def _broker_request(self, broker_id: str) -> tuple[str, dict]:
+        return ("https://fubon-ebrokerdj.fbs.com.tw/z/zg/zgb/zgb0.djhtm",
+                {
+                    "a":self.broker_info.loc[broker_id, "broker_group_query_str"],
+                    "b":self.broker_info.loc[broker_id, "broker_query_str"],
+                    "c":"B",
+                    "e":self.date_str,
+                    "f":self.date_str
+                })
     
     def parse_df(self, df: pd.DataFrame):
-        df.columns = ["stk_link", "buy","sell","volume","broker_id"]
-        df['volume'] = df['volume'].str[0]
-        df['buy'] = df['buy'].str[0]
-        df['sell'] = df['sell'].str[0]
-        stk_0 = df['stk_link'].str[0]
-        stk_1 = df['stk_link'].str[1]
-        etf_ids = stk_1.str.extract(r"Link2Stk\('(\w+)'\)")[0] # regex for ETFs: javascript:Link2Stk('0050');
-        stock_ids = stk_0.str.extract(r"GenLink2stk\('AS(\d+)'")[0] # regex for stocks: GenLink2stk('AS2330','台積電');
-        df["stock_id"] = etf_ids.combine_first(stock_ids)
-        df = self.parse_comma(df)
-        df[["buy","sell","volume"]] = self.to_numeric(df[["buy","sell","volume"]]).astype(int)
+        df = self.parse_numeric(df, {"buy": "int64", "sell": "int64", "volume": "int64"})
         df['turnover'] = df['buy'] + df['sell']
         df['date'] = self.date
         return df[self.__columns]
     
     def run(self):
-        with ThreadPoolExecutor() as executor:
-            dfs = list(executor.map(self._scrape_broker, self.broker_info.index))
-        result = pd.concat([df for df in dfs if not df.empty], ignore_index=True)
-        return self.parse_df(result)
+        columns = {"stock_id": [], "buy": [], "sell": [], "volume": [], "broker_id": []}
+        broker_ids = self.broker_info.index
+        results = async_fetcher.fetch_and_parse([self._broker_request(broker_id) for broker_id in broker_ids],
+                                                _parse_broker_page, [(broker_id,) for broker_id in broker_ids],
+                                                stats_name="broker_transaction")
+        for page_columns, error in results:
+            if error is not None:
+                print(f"Extraction Error occurs at {error}")
+                self.errors.append(error)
+            for col, values in page_columns.items():
+                columns[col].extend(values)
+        return self.parse_df(pd.DataFrame(columns))
 
 
 class BrokerTransaction(Base):
     __tablename__ = 'broker_transaction'
+    __table_args__ = (
+        Index("ix_broker_transaction_stock_id_date", "stock_id", "date"),
+        Index("ix_broker_transaction_broker_id_date", "broker_id", "date"),
+        Index("brin_broker_transaction_date", "date", postgresql_using="brin"),
+    )
     _scraper = BrokerTransactionScraper
+    _depends_on = ["IndexPrice", "BrokerInfo"] # reads broker_info
 
     date = Column(DateTime, primary_key=True, nullable=False)
     stock_id = Column(String(8), primary_key=True, nullable=False)
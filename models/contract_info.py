@@ -6,6 +6,7 @@ from base_class.base_scraper import OneTimeScraper
 from models.base import Base
 
 class ContractInfoScraper(OneTimeScraper):
+    _requests_per_run = {"taifex.com.tw": 1}
 
     def __init__(self):
         super().__init__()
@@ -22,6 +23,7 @@ class ContractInfoScraper(OneTimeScraper):
 class ContractInfo(Base):
     __tablename__ = 'contract_info'
     _scraper = ContractInfoScraper
+    _depends_on = ["IndexPrice"]
 
     contract_id = Column(String(8), primary_key=True, nullable=False)
     stock_id = Column(String(8), nullable=True)
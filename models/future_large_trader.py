@@ -3,10 +3,12 @@ import pandas as pd
 from io import StringIO
 from sqlalchemy import Column, DateTime, String, REAL, BigInteger
 
+from util.db_utils import ModelFrameMapper
 from base_class.base_scraper import DailyScraper
 from models.base import Base
 
 class FutureLargeTraderScraper(DailyScraper):
+    _requests_per_run = {"taifex.com.tw": 2}
 
     def __init__(self, date):
         super().__init__(date)
@@ -42,24 +44,22 @@ class FutureLargeTraderScraper(DailyScraper):
         df = df[df['due_date'] == "所有 契約"].reset_index(drop=True)
         df['contract_name'] = df['contract_name'].str.split('(', n=1).str[0].str.strip()
         df['contract_id'] = df['contract_name'].map(self.get_contract_dict())
+        # cells hold the value of the top traders and, in parentheses, that of the institutional investors among them,
+        # e.g. "1,234 (567)" and "12.3% (4.5%)"
         vol_cols = ['buy_top5_volume', 'buy_top10_volume', 'sell_top5_volume', 'sell_top10_volume']
-        df[vol_cols] = self.parse_comma(df[vol_cols])
-        for col in vol_cols:
-
-            extracted = df[col].str.replace(" ","").str.extract(r'([\d,]+)\s*\(([\d,]+)\)').astype(int)
-
-            total_volume = extracted[0]
-            institution_volume = extracted[1]
-            
-            df[col] = total_volume
-            df[f'{col.removesuffix("_volume")}_ii_ratio'] = np.where(total_volume == 0, 0., institution_volume / total_volume)
-        
         ratio_cols = ['buy_top5_ratio', 'buy_top10_ratio', 'sell_top5_ratio', 'sell_top10_ratio']
-
+        for col in vol_cols:
+            extracted = df[col].str.extract(r'([\d,]+)\s*\(\s*([\d,]+)\s*\)')
+            df[col], df[f'{col}_ii'] = extracted[0], extracted[1]
         for col in ratio_cols:
+            df[col] = df[col].str.split('(', n=1).str[0].str.replace('%', '')
+        df = self.parse_numeric(df, {**ModelFrameMapper(FutureLargeTrader).pandas_dtypes,
+                                     **{f'{col}_ii': "int64" for col in vol_cols}})
 
-            df[col] = df[col].str.split('(', n=1).str[0]
-            df[col] = df[col].str.replace('%', '').astype(float)/100
+        for col in vol_cols:
+            total_volume, institution_volume = df[col], df.pop(f'{col}_ii')
+            df[f'{col.removesuffix("_volume")}_ii_ratio'] = np.where(total_volume == 0, 0., institution_volume / total_volume)
+        df[ratio_cols] = df[ratio_cols] / 100
         
         df['date'] = self.date
 
@@ -68,6 +68,7 @@ class FutureLargeTraderScraper(DailyScraper):
 class FutureLargeTrader(Base):
     __tablename__ = 'future_large_trader'
     _scraper = FutureLargeTraderScraper
+    _depends_on = ["IndexPrice"]
 
     date = Column(DateTime, primary_key=True, nullable=False)
     contract_id = Column(String(8), primary_key=True, nullable=False)
@@ -1,16 +1,27 @@
 import pandas as pd
 from sqlalchemy import Column, DateTime, REAL, BigInteger
 
+from util.roc_date import roc_to_datetime
+from util.db_utils import ModelFrameMapper
 from base_class.base_scraper import DateChunkScraper
 from models.base import Base
 
 class IndexPriceScraper(DateChunkScraper):
+    _requests_per_run = {"twse.com.tw": 2} # per month
 
     def __init__(self, start_date: pd.Timestamp):
         super().__init__(start_date)
+        self.query_dates = self._query_dates(start_date)
+
+    @staticmethod
+    def _query_dates(start_date: pd.Timestamp) -> pd.DatetimeIndex:
         start_date = start_date.replace(day=1)
         end_date = pd.Timestamp.now().replace(day=1)
-        self.query_dates = pd.date_range(start = start_date, end = end_date, freq='MS')
+        return pd.date_range(start = start_date, end = end_date, freq='MS')
+
+    @classmethod
+    def plan_chunks(cls, start_date: pd.Timestamp) -> int:
+        return len(cls._query_dates(start_date))
     
     def _scrape_date(self, date:pd.Timestamp, test_mode = False):
         url = "https://www.twse.com.tw/rwd/zh/TAIEX/MI_5MINS_HIST"
@@ -18,30 +29,26 @@ class IndexPriceScraper(DateChunkScraper):
         response = self.session.get(url, params=params)
         self.validate_response(response)
         df = pd.DataFrame(response.json()['data'], columns = ['date','open','high','low','close'])
-        df['date'] = df['date'].str.strip().str.replace(r"^\d+", lambda x: str(int(x.group()) + 1911), regex=True)
-        df['date'] = pd.to_datetime(df['date'], format="%Y/%m/%d")
+        df['date'] = roc_to_datetime(df['date'])
         if test_mode: return df
-        self.respect_rate_limit()
         
         url = "https://www.twse.com.tw/rwd/zh/afterTrading/FMTQIK"
         response = self.session.get(url, params=params)
         self.validate_response(response)
         volume = pd.DataFrame(response.json()['data'])[2]
         df['volume'] = volume
-        self.respect_rate_limit()
         return df
     def run(self):
         for t in self.query_dates:
             df = self._scrape_date(t)
             df = df[df['date'] >= self.start_date].reset_index(drop=True)
-            numeric_cols = ['open','high','low','close','volume']
-            df[numeric_cols] = self.parse_comma(df[numeric_cols])
-            df[numeric_cols] = self.to_numeric(df[numeric_cols]).astype(float)
+            df = self.parse_numeric(df, ModelFrameMapper(IndexPrice).pandas_dtypes)
             yield df
 
 class IndexPrice(Base):
     __tablename__ = 'index_price'
     _scraper = IndexPriceScraper
+    _depends_on = [] # defines the timeline of every other model
 
     date = Column(DateTime, primary_key=True, nullable=False)
     open = Column(REAL, nullable=True)
@@ -0,0 +1,41 @@
+from sqlalchemy import Column, DateTime, String, BigInteger, Integer
+
+from models.base import Base
+
+class IngestionWatermark(Base):
+    """
+    One row per data table: the loaded date range and row count, maintained by `save_to_sql`.
+    """
+    __tablename__ = 'ingestion_watermark'
+
+    table_name = Column(String(32), primary_key=True, nullable=False)
+    min_date = Column(DateTime, nullable=True)
+    max_date = Column(DateTime, nullable=True)
+    row_count = Column(BigInteger, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+class IngestionDate(Base):
+    """
+    One row per (data table, loaded date) with the number of rows stored for that date.
+    """
+    __tablename__ = 'ingestion_date'
+
+    table_name = Column(String(32), primary_key=True, nullable=False)
+    date = Column(DateTime, primary_key=True, nullable=False)
+    row_count = Column(BigInteger, nullable=False)
+    loaded_at = Column(DateTime, nullable=False)
+
+class IngestionJournal(Base):
+    """
+    One row per (data table, work unit) scheduled by a task runner, e.g. one date of a daily task.
+    `status` is one of pending, running, done, failed; see util/journal.py.
+    """
+    __tablename__ = 'ingestion_journal'
+
+    table_name = Column(String(32), primary_key=True, nullable=False)
+    unit_key = Column(String(64), primary_key=True, nullable=False)
+    status = Column(String(8), nullable=False)
+    attempts = Column(Integer, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    error = Column(String(512), nullable=True)
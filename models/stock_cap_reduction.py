@@ -4,11 +4,15 @@ from sqlalchemy import Column, DateTime, REAL, String
 import warnings
 
 from config.settings import DEFAULT_START_DATES
+from util.roc_date import roc_to_datetime
+from util.db_utils import ModelFrameMapper
 from base_class.base_scraper import PeriodicScraper
 from models.base import Base
 
 
 class StockCapReductionScraper(PeriodicScraper):
+    _requests_per_run = {"twse.com.tw": 1, "tpex.org.tw": 1}
+
     def __init__(self, start_date: pd.Timestamp):
         """
         The `date` column represents the date when the stock resumes trading after a capital reduction,  
@@ -17,17 +21,6 @@ class StockCapReductionScraper(PeriodicScraper):
         super().__init__(start_date)
         self.date_now = pd.Timestamp.now().normalize()
     
-    @staticmethod
-    def _mk_to_datetime(s:pd.Series, format): 
-        if format == 'twse': # format: 108/01/02
-            s_year = s.str.extract(r'(\d+)/(\d+)/(\d+)')[0].astype(int) + 1911
-            s_month_day = s.str.extract(r'\d+/(\d+)/(\d+)')
-        elif format == 'tpex': # format: 1080102
-            s_year = s.str[:3].astype(int) + 1911
-            s_month_day = s.str[3:5], s.str[5:7]
-        s_dt = pd.to_datetime(s_year.astype(str) + "-" + s_month_day[0] + "-" + s_month_day[1])
-        return s_dt
-
     def _twse_cap_reduction(self):
         
         start_date = max(self.start_date, DEFAULT_START_DATES["StockCapReduction"])
@@ -47,10 +40,8 @@ class StockCapReductionScraper(PeriodicScraper):
         df = df.rename(columns = {'恢復買賣日期':"date",'股票代號':"stock_id",
                                 '停止買賣前收盤價格':"reduction_close",'開盤競價基準':"open_ref_price",
                                 '減資原因':"reduction_reason",'恢復買賣參考價':"reduction_ref_price"})
-        df['date'] = self._mk_to_datetime(df['date'], 'twse')
-        float_cols = ['reduction_close', 'reduction_ref_price', 'open_ref_price']
-        df[float_cols] = self.parse_comma(df[float_cols])
-        df[float_cols] = self.to_numeric(df[float_cols])
+        df['date'] = roc_to_datetime(df['date'])
+        df = self.parse_numeric(df, ModelFrameMapper(StockCapReduction).pandas_dtypes)
         df['adjustment_factor'] = df['reduction_close']/df['open_ref_price']
         if not set(df['reduction_reason'].unique()) <= {'退還股款', '彌補虧損'}:
             warnings.warn(f'unexpected reduction reason occurs in: {df['reduction_reason'].unique()}')
@@ -74,10 +65,8 @@ class StockCapReductionScraper(PeriodicScraper):
         df = df.rename(columns = {'恢復買賣日期':"date",'股票代號':"stock_id",
                         '最後交易日之收盤價格':"reduction_close",'開始交易基準價':"open_ref_price",
                         '減資原因':"reduction_reason",'減資恢復買賣開始日參考價格':"reduction_ref_price"})
-        df['date'] = self._mk_to_datetime(df['date'], 'tpex')
-        float_cols = ['reduction_close', 'reduction_ref_price', 'open_ref_price']
-        df[float_cols] = self.parse_comma(df[float_cols])
-        df[float_cols] = self.to_numeric(df[float_cols])
+        df['date'] = roc_to_datetime(df['date'])
+        df = self.parse_numeric(df, ModelFrameMapper(StockCapReduction).pandas_dtypes)
         df['adjustment_factor'] = df['reduction_close']/df['open_ref_price']
         if not set(df['reduction_reason'].unique()) <= {'現金減資', '彌補虧損'}:
             warnings.warn(f'unexpected reduction reason occurs in: {df['reduction_reason'].unique()}')
@@ -95,6 +84,7 @@ class StockCapReductionScraper(PeriodicScraper):
 class StockCapReduction(Base):
     __tablename__ = 'stock_cap_reduction'
     _scraper = StockCapReductionScraper
+    _depends_on = ["IndexPrice"]
 
     date = Column(DateTime, primary_key=True, nullable=False)
     stock_id = Column(String(8), primary_key=True, nullable=False)
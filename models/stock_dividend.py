@@ -3,10 +3,14 @@ from io import StringIO
 from sqlalchemy import Column, DateTime, REAL, String
 import warnings
 
+from util.roc_date import roc_to_datetime
+from util.db_utils import ModelFrameMapper
 from base_class.base_scraper import PeriodicScraper
 from models.base import Base
 
 class StockDividendScraper(PeriodicScraper):
+    _requests_per_run = {"twse.com.tw": 1, "tpex.org.tw": 1}
+
     def __init__(self, start_date: pd.Timestamp):
         """
         The `date` column represents the date when the stock completes its dividend distribution,  
@@ -15,17 +19,6 @@ class StockDividendScraper(PeriodicScraper):
         super().__init__(start_date)
         self.date_now = pd.Timestamp.now().normalize()
     
-    @staticmethod
-    def _mk_to_datetime(s:pd.Series, format): 
-        if format == 'twse': # format: 108年01月02日
-            s_year = s.str.extract(r'(\d+)年')[0].astype(int) + 1911
-            s_month_day = s.str.extract(r'(\d+)月(\d+)日')
-        elif format == 'tpex': # format: 108/01/01
-            s_year = s.str.extract(r'(\d+)/(\d+)/(\d+)')[0].astype(int) + 1911
-            s_month_day = s.str.extract(r'\d+/(\d+)/(\d+)')
-        s_dt = pd.to_datetime(s_year.astype(str) + "-" + s_month_day[0] + "-" + s_month_day[1])
-        return s_dt
-
     def _twse_divide_ratio(self):
         
         response = self.session.get(
@@ -45,10 +38,8 @@ class StockDividendScraper(PeriodicScraper):
         df = df.rename(columns = {'資料日期':"date",'股票代號':"stock_id",
                                 '除權息前收盤價':"ex_div_close",'開盤競價基準':"open_ref_price",
                                 '權值+息值':"dividend_value",'權/息':"dividend_type",'除權息參考價':"div_ref_price"})
-        df['date'] = self._mk_to_datetime(df['date'], 'twse')
-        float_cols = ['ex_div_close', 'open_ref_price', 'dividend_value','div_ref_price']
-        df[float_cols] = self.parse_comma(df[float_cols])
-        df[float_cols] = self.to_numeric(df[float_cols])
+        df['date'] = roc_to_datetime(df['date'])
+        df = self.parse_numeric(df, ModelFrameMapper(StockDividend).pandas_dtypes)
         df['adjustment_factor'] = df['ex_div_close']/df['open_ref_price']
         if not set(df['dividend_type'].unique()) <= {'權', '息', '權息'}:
             warnings.warn(f'unexpected dividend type occurs in: {df['dividend_type'].unique()}')
@@ -73,10 +64,8 @@ class StockDividendScraper(PeriodicScraper):
         df = df.rename(columns = {'除權息日期':"date",'代號':"stock_id",
                                 '除權息前收盤價':"ex_div_close",'開始交易基準價':"open_ref_price",
                                 '權值+息值':"dividend_value",'權/息':"dividend_type",'除權息參考價':"div_ref_price"})
-        df['date'] = self._mk_to_datetime(df['date'],'tpex')
-        float_cols = ['ex_div_close', 'open_ref_price', 'dividend_value','div_ref_price']
-        df[float_cols] = self.parse_comma(df[float_cols])
-        df[float_cols] = self.to_numeric(df[float_cols])
+        df['date'] = roc_to_datetime(df['date'])
+        df = self.parse_numeric(df, ModelFrameMapper(StockDividend).pandas_dtypes)
         df['adjustment_factor'] = df['ex_div_close']/df['open_ref_price']
         if not set(df['dividend_type'].unique()) <= {'除息', '除權', '除權息'}:
             warnings.warn(f'unexpected dividend type occurs in: {df['dividend_type'].unique()}')
@@ -95,6 +84,7 @@ class StockDividendScraper(PeriodicScraper):
 class StockDividend(Base):
     __tablename__ = 'stock_dividend'
     _scraper = StockDividendScraper
+    _depends_on = ["IndexPrice"]
 
     date = Column(DateTime, primary_key=True, nullable=False)
     stock_id = Column(String(8), primary_key=True, nullable=False)
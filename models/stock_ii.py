@@ -1,11 +1,12 @@
 import pandas as pd
-from sqlalchemy import Column, DateTime, String, BigInteger
+from sqlalchemy import Column, DateTime, String, BigInteger, Index
 
 from base_class.base_scraper import DailyScraper
+from util.json_extract import select_json_table
 from models.base import Base
-from util.retry import retry
 
 class StockIIScraper(DailyScraper):
+    _requests_per_run = {"twse.com.tw": 1, "tpex.org.tw": 1}
 
     def __init__(self, date):
         super().__init__(date)
@@ -26,8 +27,7 @@ class StockIIScraper(DailyScraper):
 
     def _parse_df(self, df: pd.DataFrame):
         num_cols = [col for col in df.columns if col != 'stock_id' and col.isascii()]
-        df[num_cols] = self.parse_comma(df[num_cols])
-        df[num_cols] = self.to_numeric(df[num_cols]).astype(int)
+        df = self.parse_numeric(df, {col: "int64" for col in num_cols})
         for prefix in self._prefixes:
             df[f'{prefix}turnover'] = df[f'{prefix}buy'] + df[f'{prefix}sell']
         df['date'] = self.date
@@ -38,8 +38,7 @@ class StockIIScraper(DailyScraper):
                                     params={"date":self.date.strftime("%Y%m%d"),
                                             "selectType":"ALLBUT0999",
                                             "response":"json"})
-        table = response.json()
-        df = pd.DataFrame(table['data'], columns=table['fields'])
+        df = select_json_table(response.content, [])
         df.columns = [self._rename_to_suffix_style(col) for col in df.columns]
         df.columns = (df.columns
                     .str.replace('證券代號', 'stock_id')
@@ -57,8 +56,7 @@ class StockIIScraper(DailyScraper):
                                            "sect":"EW",
                                            "date":self.date.strftime("%Y/%m/%d"),
                                            "response":"json"})
-        table = response.json()['tables'][0]
-        df = pd.DataFrame(table['data'], columns=table['fields'])
+        df = select_json_table(response.content, ["tables", 0])
         col_prefixes =  pd.Index(
             ["", ""] +
             ["fii_non_dealer_"] * 3 + ["fii_dealer_"] * 3 + ["外資及陸資_"] * 3 +
@@ -71,16 +69,18 @@ class StockIIScraper(DailyScraper):
         
         return df
 
-    @retry()
     def run(self):
         dfs = [self._scrape_twse(), self._scrape_tpex()]
         df = pd.concat(dfs, join='inner', ignore_index=True)
-        self.respect_rate_limit(delay=1)
         return self._parse_df(df)
 
 class StockII(Base):
     __tablename__ = "stock_ii"
+    __table_args__ = (
+        Index("ix_stock_ii_stock_id_date", "stock_id", "date"),
+    )
     _scraper = StockIIScraper
+    _depends_on = ["IndexPrice"]
 
     date = Column(DateTime, primary_key=True, nullable=False)
     stock_id = Column(String(8), primary_key=True, nullable=False)
@@ -1,11 +1,12 @@
 import pandas as pd
-from io import StringIO
 from sqlalchemy import Column, String, DateTime
 
 from base_class.base_scraper import OneTimeScraper
+from util.html_extract import extract_isin_rows
 from models.base import Base
 
 class StockInfoScraper(OneTimeScraper):
+    _requests_per_run = {"twse.com.tw": 2}
 
     def __init__(self):
         super().__init__()
@@ -14,11 +15,9 @@ class StockInfoScraper(OneTimeScraper):
     def run(self):
         response_twse = self.session.get("https://isin.twse.com.tw/isin/C_public.jsp?strMode=2")
         response_tpex = self.session.get("https://isin.twse.com.tw/isin/C_public.jsp?strMode=4")
-        df_twse = pd.read_html(StringIO(response_twse.text), skiprows=1)[0].ffill()
-        df_tpex = pd.read_html(StringIO(response_tpex.text), skiprows=1)[0].ffill()
-        df = pd.concat([df_twse, df_tpex], ignore_index=True)
-        df.columns = ["id_and_name","isin_code","listing_date","market_type","industry_type","CFIcode","asset_type"]
-        df = df.drop(df[df.nunique(axis=1) == 1].index)
+        rows = extract_isin_rows(response_twse.text) + extract_isin_rows(response_tpex.text) # filled per page
+        df = pd.DataFrame(rows, columns=["id_and_name","isin_code","listing_date","market_type","industry_type","CFIcode","asset_type"])
+        df = df.replace("", None)
         df['market_type'] = df['market_type'].map({"上市臺灣創新板":"tib",
                                                    "上市":"twse",
                                                    "上櫃":"tpex"})
@@ -34,6 +33,7 @@ class StockInfoScraper(OneTimeScraper):
 class StockInfo(Base):
     __tablename__ = 'stock_info'
     _scraper = StockInfoScraper
+    _depends_on = ["IndexPrice"]
 
     stock_id = Column(String(8), primary_key=True, nullable=False)
     stock_name = Column(String(16), nullable=True)
@@ -1,16 +1,17 @@
 import warnings
 import pandas as pd
-from sqlalchemy import Column, DateTime, String, REAL, BigInteger
+from sqlalchemy import Column, DateTime, String, REAL, BigInteger, Index
 
 from base_class.base_scraper import DailyScraper
+from util.db_utils import ModelFrameMapper
+from util.json_extract import select_json_table
 from models.base import Base
 
 class StockPriceScraper(DailyScraper):
+    _requests_per_run = {"twse.com.tw": 1, "tpex.org.tw": 1}
 
     def __init__(self, date:pd.Timestamp):
         super().__init__(date)
-        self.__int_cols = ['volume', 'transactions_number', 'turnover']
-        self.__float_cols = ['open', 'high', 'low', 'close']
         self.__columns = ["date", "stock_id",
                             'open', 'high', 'low', 'close',
                             'volume', 'turnover', 'transactions_number']
@@ -21,24 +22,20 @@ class StockPriceScraper(DailyScraper):
             params = {"response":"json", "date":self.date.strftime('%Y%m%d'), "type":"ALLBUT0999"})
         self.validate_response(response)
         try:
-            stock_table = response.json()['tables'][8]
-            df = pd.DataFrame(data = stock_table['data'], 
-                              columns = stock_table['fields'])
-            df = df[['證券代號', '開盤價', '最高價', '最低價', '收盤價', '成交股數', '成交金額', '成交筆數']]
-            df = df.rename(columns={"證券代號": "stock_id",
+            df = select_json_table(response.content, ["tables", 8],
+                                   {"證券代號": "stock_id",
                                     "成交股數": "volume", "成交筆數": "transactions_number", "成交金額": "turnover",
                                     "開盤價": "open", "收盤價": "close",
                                     "最高價": "high", "最低價": "low",
                                     })
-            df = self.parse_comma(df)
-            df[self.__float_cols] = self.to_numeric(df[self.__float_cols]).astype(float)
-            df[self.__int_cols] = self.to_numeric(df[self.__int_cols]).astype('Int64')
+            df = self.parse_numeric(df, ModelFrameMapper(StockPrice).pandas_dtypes)
             df["date"] = self.date
             return df[self.__columns]
         
         except Exception as e:
             print(f"Extraction Error occurs at {response.url}")
             print(e)
+            self.errors.append(f"{response.url}: {e!r}")
             return pd.DataFrame(columns=self.__columns)
 
     @staticmethod
@@ -52,25 +49,21 @@ class StockPriceScraper(DailyScraper):
                     params={"response":"json", "date":self.date.strftime('%Y/%m/%d')})
         self.validate_response(response)
         try:
-            stock_table = response.json()['tables'][0]
-            df = pd.DataFrame(data = stock_table['data'], 
-                              columns = stock_table['fields'])
-            df = df[['代號', '開盤', '最高', '最低', '收盤', '成交股數', '成交金額(元)', '成交筆數']]
-            df = df.rename(columns={"代號": "stock_id",
+            df = select_json_table(response.content, ["tables", 0],
+                                   {"代號": "stock_id",
                                     "成交股數": "volume", "成交筆數": "transactions_number", "成交金額(元)": "turnover",
                                     "開盤": "open", "收盤": "close",
                                     "最高": "high", "最低": "low",
                                     })
             df = self.__select_otc_id(df)
-            df = self.parse_comma(df)
-            df[self.__float_cols] = self.to_numeric(df[self.__float_cols]).astype(float)
-            df[self.__int_cols] = self.to_numeric(df[self.__int_cols]).astype('Int64')
+            df = self.parse_numeric(df, ModelFrameMapper(StockPrice).pandas_dtypes)
             df["date"] = self.date
             return df[self.__columns]
         
         except Exception as e:
             print(f"Extraction Error occurs at {response.url}")
             print(e)
+            self.errors.append(f"{response.url}: {e!r}")
             return pd.DataFrame(columns=self.__columns)
 
 
@@ -86,7 +79,12 @@ class StockPriceScraper(DailyScraper):
 
 class StockPrice(Base):
     __tablename__ = 'stock_price'
+    __table_args__ = (
+        Index("ix_stock_price_stock_id_date", "stock_id", "date"),
+        Index("brin_stock_price_date", "date", postgresql_using="brin"),
+    )
     _scraper = StockPriceScraper
+    _depends_on = ["IndexPrice"]
 
     date = Column(DateTime, primary_key=True, nullable=False)
     stock_id = Column(String(8), primary_key=True, nullable=False)
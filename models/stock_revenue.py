@@ -1,15 +1,40 @@
 import pandas as pd
 from sqlalchemy import Column, DateTime, String, BigInteger
-from io import StringIO
-from concurrent.futures import ThreadPoolExecutor
 
-from util.db_utils import table_has_data, read_sql_fast
+from config.settings import FETCH_WORKERS
+from util.db_utils import table_has_data, read_sql_fast, ModelFrameMapper
+from util.parse_pool import fetch_and_parse, decode_content
+from util.html_extract import extract_revenue_rows
+from util.roc_date import roc_to_datetime
 from base_class.base_scraper import PeriodicScraper
 from models.stock_info import StockInfoScraper
 from models.base import Base
 
 
+def _parse_revenue_page(content: bytes, encoding: str | None, stock_id: str, url: str) -> tuple[dict[str, list], str | None]:
+    """
+    Parse stage of `StockRevenueScraper`, run in the parse pool: the column lists of the monthly revenue
+    of one stock (see `extract_revenue_rows`), and the extraction error if the page cannot be parsed.
+    """
+    try:
+        columns = extract_revenue_rows(decode_content(content, encoding))
+        columns["stock_id"] = [stock_id] * len(columns["date"])
+        return columns, None
+
+    except Exception as e:
+        return {}, f"{url}: {e!r}"
+
+
 class StockRevenueScraper(PeriodicScraper):
+    _requests_per_run = {"fubon-ebrokerdj.fbs.com.tw": 1800} # one per stock, estimate used while stock_info is empty
+    _parallel_requests = FETCH_WORKERS
+
+    @classmethod
+    def plan_requests(cls) -> dict[str, int]:
+        if not table_has_data('stock_info'):
+            return super().plan_requests()
+        n_stocks = read_sql_fast("SELECT count(*) AS n FROM stock_info WHERE asset_type = 'stk'")["n"].iloc[0]
+        return {"fubon-ebrokerdj.fbs.com.tw": int(n_stocks)}
 
     def __init__(self, start_date):
         super().__init__(start_date)
@@ -22,38 +47,25 @@ class StockRevenueScraper(PeriodicScraper):
         self.stock_ids = df.loc[df['asset_type'] == 'stk', 'stock_id'].to_list()
         self.columns = ["date","stock_id","revenue"]
 
-
-    @staticmethod
-    def _mk_to_datetime(s:pd.Series): # format: 108/01
-        extracted = s.str.split('/', n=1, expand=True)
-        s_year = extracted[0].astype(int) + 1911
-        s_month = extracted[1]
-        s_dt = pd.to_datetime(s_year.astype(str) + "-" + s_month + "-01")
-        return s_dt
-    
-    def _scrape_stock(self, stock_id: str):
+    def _fetch_stock(self, stock_id: str) -> tuple:
 
         response = self.session.get(f"https://fubon-ebrokerdj.fbs.com.tw/z/zc/zch/zch_{stock_id}.djhtm")
         self.validate_response(response)
-        
-        try:
-            df = pd.read_html(StringIO(response.text), attrs={'id':'oMainTable'}, skiprows=6)[0]
-            df = df[[0,1]]
-            df.columns = ['date','revenue']
-            df['date'] = self._mk_to_datetime(df['date'])
-            df['stock_id'] = stock_id
-            return df[self.columns]
-        
-        except Exception as e:
-            print(f"Extraction Error occurs at {response.url}")
-            print(e)
-            return pd.DataFrame(columns=self.columns)
+        return response.content, response.encoding, stock_id, response.url
 
     def run(self):
-        with ThreadPoolExecutor() as executor:
-            dfs = list(executor.map(self._scrape_stock, self.stock_ids))
+        columns = {"date": [], "stock_id": [], "revenue": []}
+        results = fetch_and_parse(self.stock_ids, self._fetch_stock, _parse_revenue_page,
+                                  stats_name="stock_revenue")
+        for page_columns, error in results:
+            if error is not None:
+                print(f"Extraction Error occurs at {error}")
+            for col, values in page_columns.items():
+                columns[col].extend(values)
 
-        df = pd.concat([df for df in dfs if not df.empty], ignore_index=True)    
+        df = pd.DataFrame(columns)
+        df['date'] = roc_to_datetime(df['date'])
+        df = self.parse_numeric(df, ModelFrameMapper(StockRevenue).pandas_dtypes)
         df = df[df['date'] >= self.start_date].reset_index(drop=True)
         return df
 
@@ -61,6 +73,7 @@ class StockRevenueScraper(PeriodicScraper):
 class StockRevenue(Base):
     __tablename__ = 'stock_revenue'
     _scraper = StockRevenueScraper
+    _depends_on = ["IndexPrice", "StockInfo"] # reads stock_info
 
     date = Column(DateTime, primary_key=True, nullable=False)
     stock_id = Column(String(8), primary_key=True, nullable=False)
@@ -2,10 +2,14 @@ import pandas as pd
 from io import StringIO
 from sqlalchemy import Column, DateTime, REAL, String
 
+from util.roc_date import roc_to_datetime
+from util.db_utils import ModelFrameMapper
 from base_class.base_scraper import PeriodicScraper
 from models.base import Base
 
 class StockSplitScraper(PeriodicScraper):
+    _requests_per_run = {"twse.com.tw": 2, "tpex.org.tw": 3}
+
     def __init__(self, start_date: pd.Timestamp):
         """
         The `date` column represents the date when the stock resumes trading after split (or merge),  
@@ -14,17 +18,6 @@ class StockSplitScraper(PeriodicScraper):
         super().__init__(start_date)
         self.date_now = pd.Timestamp.now().normalize()
     
-    @staticmethod
-    def _mk_to_datetime(s:pd.Series, format): 
-        if format == 'twse': # format: 108/01/02
-            s_year = s.str.extract(r'(\d+)/(\d+)/(\d+)')[0].astype(int) + 1911
-            s_month_day = s.str.extract(r'\d+/(\d+)/(\d+)')
-        elif format == 'tpex': # format: 1080102
-            s_year = s.str[:3].astype(int) + 1911
-            s_month_day = s.str[3:5], s.str[5:7]
-        s_dt = pd.to_datetime(s_year.astype(str) + "-" + s_month_day[0] + "-" + s_month_day[1])
-        return s_dt
-
     def _twse_split(self):
         
         response = self.session.get(
@@ -41,10 +34,8 @@ class StockSplitScraper(PeriodicScraper):
         df = df.rename(columns = {'恢復買賣日期':"date",'股票代號':"stock_id",
                                 '停止買賣前收盤價格':"split_close",'開盤競價基準':"open_ref_price",
                                 '恢復買賣參考價':"split_ref_price"})
-        df['date'] = self._mk_to_datetime(df['date'], 'twse')
-        float_cols = ['split_close', 'split_ref_price', 'open_ref_price']
-        df[float_cols] = self.parse_comma(df[float_cols])
-        df[float_cols] = self.to_numeric(df[float_cols])
+        df['date'] = roc_to_datetime(df['date'])
+        df = self.parse_numeric(df, ModelFrameMapper(StockSplit).pandas_dtypes)
         df['adjustment_factor'] = df['split_close']/df['open_ref_price']
         return df
 
@@ -63,10 +54,8 @@ class StockSplitScraper(PeriodicScraper):
         df = df.rename(columns = {'恢復買賣日期':"date",'證券代號':"stock_id",
                                 '最後交易日之收盤價格':"split_close",'開始交易基準價':"open_ref_price",
                                 '恢復買賣開始參考價':"split_ref_price"})
-        df['date'] = self._mk_to_datetime(df['date'], 'tpex')
-        float_cols = ['split_close', 'split_ref_price', 'open_ref_price']
-        df[float_cols] = self.parse_comma(df[float_cols])
-        df[float_cols] = self.to_numeric(df[float_cols])
+        df['date'] = roc_to_datetime(df['date'])
+        df = self.parse_numeric(df, ModelFrameMapper(StockSplit).pandas_dtypes)
         df['adjustment_factor'] = df['split_close']/df['open_ref_price']
         return df
     
@@ -86,10 +75,8 @@ class StockSplitScraper(PeriodicScraper):
         df = df.rename(columns = {'恢復買賣日期':"date",'ETF代號':"stock_id",
                                 '停止買賣前收盤價格':"split_close",'開盤競價基準':"open_ref_price",
                                 '恢復買賣參考價':"split_ref_price"})
-        df['date'] = self._mk_to_datetime(df['date'], 'twse')
-        float_cols = ['split_close', 'split_ref_price', 'open_ref_price']
-        df[float_cols] = self.parse_comma(df[float_cols])
-        df[float_cols] = self.to_numeric(df[float_cols])
+        df['date'] = roc_to_datetime(df['date'])
+        df = self.parse_numeric(df, ModelFrameMapper(StockSplit).pandas_dtypes)
         df['adjustment_factor'] = df['split_close']/df['open_ref_price']
         return df
     
@@ -117,10 +104,8 @@ class StockSplitScraper(PeriodicScraper):
         df = df.rename(columns = {'恢復買賣日期':"date",'證券代號':"stock_id",
                                 '最後交易日之收盤價格':"split_close",'開始交易基準價':"open_ref_price",
                                 '恢復買賣開始參考價':"split_ref_price"})
-        df['date'] = self._mk_to_datetime(df['date'], 'tpex')
-        float_cols = ['split_close', 'split_ref_price', 'open_ref_price']
-        df[float_cols] = self.parse_comma(df[float_cols])
-        df[float_cols] = self.to_numeric(df[float_cols])
+        df['date'] = roc_to_datetime(df['date'])
+        df = self.parse_numeric(df, ModelFrameMapper(StockSplit).pandas_dtypes)
         df['adjustment_factor'] = df['split_close']/df['open_ref_price']
         return df
     
@@ -141,6 +126,7 @@ class StockSplitScraper(PeriodicScraper):
 class StockSplit(Base):
     __tablename__ = 'stock_split'
     _scraper = StockSplitScraper
+    _depends_on = ["IndexPrice"]
 
     date = Column(DateTime, primary_key=True, nullable=False)
     stock_id = Column(String(8), primary_key=True, nullable=False)
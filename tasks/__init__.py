@@ -6,12 +6,51 @@ from base_class.base_transformer import Transformer
 
 from tasks.task_core import run_core_task
 from tasks.task_onetime import run_onetime_task
-from tasks.task_daily import run_daily_task
+from tasks.task_daily import run_daily_task, fill_daily_gaps
 from tasks.task_periodic import run_periodic_task
 from tasks.task_transform import run_transform_task
-from tasks.create_tables import create_tables
+from tasks.create_tables import create_tables, deferred_indexes
+from config.settings import MIRROR_DIR
+from util.mirror import refresh_mirror
+from util.parse_pool import report_stage_stats
+from util.http_utils import report_rate_limit_stats, report_connection_stats
+from util.async_fetch import async_fetcher
 
-def run_task(model: Type[DeclarativeBase]) -> None:
+def run_task(model: Type[DeclarativeBase], workers: int = 1) -> None:
+    """
+    Run the task of a model. `workers` is the number of dates scraped concurrently by daily tasks.
+    """
+    _run_model_task(model, workers)
+    _finish_task(model)
+
+def run_gap_fill_task(model: Type[DeclarativeBase], workers: int = 1, min_row_ratio: float = None) -> None:
+    """
+    Rescrape the missing (and with `min_row_ratio`, underpopulated) dates of a daily model.
+    Other models have no trading-date calendar to check against and are skipped.
+    """
+    if not issubclass(model._scraper, DailyScraper):
+        print(f"Skipping gap fill of {model.__name__}: not a daily model")
+        return
+
+    fill_daily_gaps(model, workers=workers, min_row_ratio=min_row_ratio)
+    _finish_task(model)
+
+def report_run_stats() -> None:
+    """
+    Print and reset the fetch/parse, rate limit, connection and async fetch statistics.
+    The counters are process-wide, so call this once all tasks are done: tasks run
+    concurrently (`--jobs`) would otherwise reset each other's numbers.
+    """
+    report_stage_stats()
+    report_rate_limit_stats()
+    report_connection_stats()
+    async_fetcher.report()
+
+def _finish_task(model: Type[DeclarativeBase]) -> None:
+    if MIRROR_DIR:
+        refresh_mirror(model)
+
+def _run_model_task(model: Type[DeclarativeBase], workers: int) -> None:
 
     if model.__name__ == "IndexPrice":
         run_core_task(model)
@@ -22,7 +61,7 @@ def run_task(model: Type[DeclarativeBase]) -> None:
     if issubclass(scraper_cls, OneTimeScraper):
         run_onetime_task(model)
     elif issubclass(scraper_cls, DailyScraper):
-        run_daily_task(model)
+        run_daily_task(model, workers=workers)
     elif issubclass(scraper_cls, PeriodicScraper):
         run_periodic_task(model)
     elif issubclass(scraper_cls, Transformer):
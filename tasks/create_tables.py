@@ -1,31 +1,201 @@
-from sqlalchemy import create_engine, inspect
-from models import get_model
+import pandas as pd
+from contextlib import contextmanager
+from typing import Type
+from sqlalchemy import inspect, text, MetaData, Table
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.schema import CreateTable
 from models import Base
-from config.settings import SQLALCHEMY_DATABASE_URL, DB_NAME, ROUTINE_CONFIG
+from config.settings import DB_NAME, PARTITIONED_TABLES, PARTITION_PREMAKE
+from util.db_utils import get_engine
 
 def _get_all_table_set():
-    return set(get_model(mn).__tablename__ for mn in ROUTINE_CONFIG['all'])
+    # model tables plus the ingestion catalog
+    return set(Base.metadata.tables)
 
 def _get_table_set(engine):
     inspector = inspect(engine)
     return set(inspector.get_table_names())
 
+def _is_partitioned(conn: Connection, table_name: str) -> bool:
+    query = text("""SELECT EXISTS (
+                        SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid
+                        WHERE c.relname = :table_name)""")
+    return conn.execute(query, {"table_name": table_name}).scalar()
+
+def _create_partitioned_table(conn: Connection, table: Table):
+    """
+    Create `table` as a range-partitioned table on `date` (without any partition).
+    """
+    ddl = str(CreateTable(table).compile(dialect=conn.dialect)).rstrip()
+    conn.exec_driver_sql(f"{ddl} PARTITION BY RANGE (date)")
+
+def _partition_periods(granularity: str, start_date: pd.Timestamp, end_date: pd.Timestamp) -> pd.PeriodIndex:
+    freq = {"year": "Y", "month": "M"}[granularity]
+    return pd.period_range(start_date, end_date, freq=freq)
+
+def _create_partitions(conn: Connection, parent: str, partition_prefix: str, granularity: str,
+                       start_date: pd.Timestamp, end_date: pd.Timestamp) -> list[str]:
+    created = []
+    for period in _partition_periods(granularity, start_date, end_date):
+        suffix = f"y{period.year}" if granularity == "year" else f"m{period.year}{period.month:02d}"
+        partition = f"{partition_prefix}_{suffix}"
+        lower, upper = period.start_time, (period + 1).start_time
+        conn.exec_driver_sql(
+            f"CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {parent} "
+            f"FOR VALUES FROM ('{lower:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')"
+        )
+        created.append(partition)
+    return created
+
+def ensure_partitions(table_name: str, start_date: pd.Timestamp, end_date: pd.Timestamp = None):
+    """
+    Create the partitions of a partitioned table covering `start_date` to `end_date`,
+    plus `PARTITION_PREMAKE` periods ahead. Does nothing for plain tables.
+    """
+    granularity = PARTITIONED_TABLES.get(table_name)
+    if granularity is None:
+        return
+
+    end_date = end_date if end_date is not None else pd.Timestamp.today().normalize()
+    end_date = end_date + (pd.DateOffset(years=PARTITION_PREMAKE) if granularity == "year"
+                           else pd.DateOffset(months=PARTITION_PREMAKE))
+
+    with get_engine().begin() as conn:
+        if not _is_partitioned(conn, table_name):
+            return
+        _create_partitions(conn, table_name, table_name, granularity, start_date, end_date)
+
+def migrate_to_partitioned(table_name: str):
+    """
+    Rebuild an existing plain table as a partitioned table, in a single transaction.
+    Rows are copied into a new partitioned table which then replaces the old one.
+    """
+    granularity = PARTITIONED_TABLES[table_name]
+    table = Base.metadata.tables[table_name]
+    staging_name = f"{table_name}__new"
+
+    with get_engine().begin() as conn:
+        if _is_partitioned(conn, table_name):
+            print(f"{table_name} is already partitioned. Skipping.")
+            return
+
+        min_date, max_date = conn.exec_driver_sql(f"SELECT MIN(date), MAX(date) FROM {table_name}").one()
+        _create_partitioned_table(conn, table.to_metadata(MetaData(), name=staging_name))
+
+        if min_date is not None:
+            partitions = _create_partitions(conn, staging_name, table_name, granularity,
+                                            pd.Timestamp(min_date), pd.Timestamp(max_date))
+            print(f"Created {len(partitions)} partitions for {table_name}")
+
+        columns = ", ".join(column.name for column in table.columns)
+        conn.exec_driver_sql(f"INSERT INTO {staging_name} ({columns}) SELECT {columns} FROM {table_name}")
+        conn.exec_driver_sql(f"DROP TABLE {table_name}")
+        conn.exec_driver_sql(f"ALTER TABLE {staging_name} RENAME TO {table_name}")
+        conn.exec_driver_sql(f"ALTER INDEX {staging_name}_pkey RENAME TO {table_name}_pkey")
+
+    print(f"Migrated {table_name} to {granularity}ly partitions")
+
+def reconcile_indexes(engine, drop_unmanaged: bool = False):
+    """
+    Create the secondary indexes declared in each model's `__table_args__` that are missing in the database.
+    Indexes in the database that no model declares are reported, and dropped if `drop_unmanaged`.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    with engine.begin() as conn:
+        for table_name, table in Base.metadata.tables.items():
+            if table_name not in existing_tables:
+                continue
+            existing = {index["name"] for index in inspector.get_indexes(table_name)
+                        if not index.get("duplicates_constraint")}
+            declared = {index.name for index in table.indexes}
+
+            for index in table.indexes:
+                if index.name not in existing:
+                    print(f"Create index {index.name}")
+                    index.create(conn)
+
+            for index_name in sorted(existing - declared):
+                if drop_unmanaged:
+                    print(f"Drop unmanaged index {index_name}")
+                    conn.exec_driver_sql(f"DROP INDEX {index_name}")
+                else:
+                    print(f"Unmanaged index on {table_name}: {index_name}")
+
+def drop_secondary_indexes(model: Type[DeclarativeBase]):
+    """
+    Drop the declared secondary indexes of a model, keeping its primary key.
+    """
+    with get_engine().begin() as conn:
+        for index in model.__table__.indexes:
+            print(f"Drop index {index.name}")
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {index.name}")
+
+def rebuild_secondary_indexes(model: Type[DeclarativeBase]):
+    """
+    Create the declared secondary indexes of a model that do not exist.
+    """
+    with get_engine().begin() as conn:
+        for index in model.__table__.indexes:
+            print(f"Build index {index.name}")
+            index.create(conn, checkfirst=True)
+
+@contextmanager
+def deferred_indexes(model: Type[DeclarativeBase]):
+    """
+    Drop a model's secondary indexes for the duration of a large backfill and rebuild them afterwards.
+    """
+    drop_secondary_indexes(model)
+    try:
+        yield
+    finally:
+        rebuild_secondary_indexes(model)
+
 def create_tables():
 
     print("Create tables")
-    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    engine = get_engine()
     existing_tables = _get_table_set(engine)
-    if existing_tables == _get_all_table_set():
+    if _get_all_table_set() <= existing_tables: # partitions also show up as tables
         print("All tables exists. Skipping.")
-        return
-    
-    Base.metadata.create_all(engine)
-    updated_tables = _get_table_set(engine)
-    
-    new_tables = updated_tables - existing_tables
+    else:
+        with engine.begin() as conn:
+            for table_name in PARTITIONED_TABLES:
+                if table_name not in existing_tables:
+                    _create_partitioned_table(conn, Base.metadata.tables[table_name])
+
+        Base.metadata.create_all(engine)
+        updated_tables = _get_table_set(engine)
+
+        new_tables = updated_tables - existing_tables
+
+        print(f"{DB_NAME} content: {sorted(existing_tables)}")
+        print(f"Add new tables: {sorted(new_tables)}")
+
+    reconcile_indexes(engine)
+
+if __name__ == "__main__":
+    import argparse
 
-    print(f"{DB_NAME} content: {sorted(existing_tables)}")
-    print(f"Add new tables: {sorted(new_tables)}")
+    parser = argparse.ArgumentParser(description="Create tables")
+    parser.add_argument(
+        "--migrate-partitions",
+        action="store_true",
+        help=f"Migrate existing plain tables to partitioned tables (configured: {', '.join(PARTITIONED_TABLES)})"
+    )
+    parser.add_argument(
+        "--drop-unmanaged-indexes",
+        action="store_true",
+        help="Drop indexes that are not declared by any model (default: only report them)"
+    )
+    args = parser.parse_args()
 
-if __name__ == "__main__":    
     create_tables()
+    if args.migrate_partitions:
+        for table_name in PARTITIONED_TABLES:
+            migrate_to_partitioned(table_name)
+        reconcile_indexes(get_engine())
+    if args.drop_unmanaged_indexes:
+        reconcile_indexes(get_engine(), drop_unmanaged=True)
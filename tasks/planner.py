@@ -0,0 +1,107 @@
+from typing import Type
+import pandas as pd
+from sqlalchemy.orm import DeclarativeBase
+
+from config.settings import (HOST_MAX_CONCURRENCY, DEFAULT_HOST_MAX_CONCURRENCY, DEFAULT_START_DATES,
+                             HOST_RATE_LIMITS, DEFAULT_HOST_RATE_LIMIT, PLAN_REQUEST_LATENCY)
+from util.catalog import read_only_catalog
+from util.db_utils import get_latest_date, get_min_date, get_date_serie
+from base_class.base_scraper import OneTimeScraper, DailyScraper, PeriodicScraper
+from base_class.base_transformer import Transformer
+from tasks.task_core import resolve_core_start
+from tasks.task_daily import resolve_daily_start, get_daily_target_dates, find_date_gaps
+from tasks.task_periodic import resolve_periodic_start
+
+def _estimate_wall_time(scraper_cls: type, units: int, requests_per_unit: dict[str, int], parallel_units: int) -> float:
+    """
+    Seconds to run `units` units of `parallel_units` at a time. Each host is bound either by its rate limit
+    (beyond the initial burst) or by the requests it can have in flight.
+    """
+    if not requests_per_unit: # transformers and skipped tasks
+        return 0.
+
+    host_times = []
+    for host, n_per_unit in requests_per_unit.items():
+        n_requests = n_per_unit * units
+        in_flight = min(HOST_MAX_CONCURRENCY.get(host, DEFAULT_HOST_MAX_CONCURRENCY),
+                        parallel_units * scraper_cls._parallel_requests)
+        limit = HOST_RATE_LIMITS.get(host, DEFAULT_HOST_RATE_LIMIT)
+        host_times.append(max(max(n_requests - limit["burst"], 0) / limit["rate"],
+                              n_requests * PLAN_REQUEST_LATENCY / in_flight))
+    return max(host_times)
+
+def _planning_calendar() -> pd.Series:
+    """
+    Trading dates daily tasks would scrape: those of `index_price`, followed by the business days up to
+    today, since IndexPrice runs (and extends the calendar) before the daily tasks.
+    """
+    calendar = get_date_serie("index_price")
+    start = DEFAULT_START_DATES["IndexPrice"] if calendar is None else calendar.max() + pd.offsets.BDay()
+    business_days = pd.Series(pd.bdate_range(start, pd.Timestamp.now().normalize()))
+    return business_days if calendar is None else pd.concat([calendar, business_days], ignore_index=True)
+
+def plan_task(model: Type[DeclarativeBase], workers: int = 1, fill_gaps: bool = False,
+              min_row_ratio: float = None) -> dict:
+    """
+    Resolve what the task of a model would scrape, the same way the task modules do, without scraping anything.
+    Returns the start date, the number of units (dates, chunks or runs), the requests per host key
+    and the estimated wall time in seconds. Only reads from the database, which may be empty: tables
+    not created yet read as empty, and the catalog is not rebuilt.
+    """
+    with read_only_catalog():
+        return _plan_task(model, workers, fill_gaps, min_row_ratio)
+
+def _plan_task(model: Type[DeclarativeBase], workers: int, fill_gaps: bool, min_row_ratio: float | None) -> dict:
+    scraper_cls = model._scraper
+    start_date, units, parallel_units = None, 1, 1
+
+    if fill_gaps and not issubclass(scraper_cls, DailyScraper):
+        units = 0 # gap fills only cover daily models
+    elif model.__name__ == "IndexPrice":
+        start_date, _ = resolve_core_start(model)
+        units = scraper_cls.plan_chunks(start_date)
+    elif issubclass(scraper_cls, DailyScraper):
+        if fill_gaps:
+            target_dates = find_date_gaps(model, min_row_ratio)["date"]
+        else:
+            start_date, latest = resolve_daily_start(model)
+            target_dates, retry_dates = get_daily_target_dates(model, start_date, latest, _planning_calendar())
+            target_dates = pd.concat([retry_dates, target_dates])
+        units, parallel_units = len(target_dates), workers
+        if fill_gaps and units:
+            start_date = target_dates.min()
+    elif issubclass(scraper_cls, PeriodicScraper):
+        if get_latest_date(model.__tablename__) is None and get_min_date("index_price") is None:
+            start_date = DEFAULT_START_DATES["IndexPrice"] # anchored to index_price, loaded first
+        else:
+            start_date, _ = resolve_periodic_start(model)
+    elif not issubclass(scraper_cls, (OneTimeScraper, Transformer)):
+        raise ValueError(f"Unsupported scraper/transformer type: {scraper_cls.__name__}")
+
+    requests_per_unit = scraper_cls.plan_requests() if units and not issubclass(scraper_cls, Transformer) else {}
+    return {
+        "model": model.__name__,
+        "start_date": start_date,
+        "units": units,
+        "requests": {host: n * units for host, n in requests_per_unit.items()},
+        "wall_time": _estimate_wall_time(scraper_cls, units, requests_per_unit, parallel_units),
+    }
+
+def plan_models(models: list[Type[DeclarativeBase]], workers: int = 1, fill_gaps: bool = False,
+                min_row_ratio: float = None) -> pd.DataFrame:
+    """
+    Plan the tasks of `models` and print the requests per host and estimated wall time of each.
+    """
+    plans = [plan_task(model, workers, fill_gaps, min_row_ratio) for model in models]
+    df = pd.DataFrame([{"model": plan["model"], "start_date": plan["start_date"], "units": plan["units"],
+                        **plan["requests"], "wall_time": plan["wall_time"]} for plan in plans])
+    hosts = [col for col in df.columns if col not in ("model", "start_date", "units", "wall_time")]
+    df[hosts] = df[hosts].fillna(0).astype(int)
+    df = df[["model", "start_date", "units", *hosts, "wall_time"]]
+    df["wall_time"] = pd.to_timedelta(df["wall_time"], unit="s").dt.round("s")
+
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(df.to_string(index=False))
+    print(f"\nTotal requests: {df[hosts].sum().to_dict()}")
+    print(f"Estimated wall time, models run one after another: {df['wall_time'].sum()}")
+    return df
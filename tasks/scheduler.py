@@ -0,0 +1,98 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Type
+from sqlalchemy.orm import DeclarativeBase
+
+from base_class.base_scraper import DailyScraper
+from tasks import run_task
+
+def _dependency_graph(models: list[Type[DeclarativeBase]]) -> dict[str, list[str]]:
+    """
+    Map each model name to the models it depends on, restricted to the given models.
+    Dependencies outside the list (not part of the routine, or skipped) count as satisfied.
+    """
+    names = {model.__name__ for model in models}
+    graph = {model.__name__: [dep for dep in model._depends_on if dep in names] for model in models}
+
+    # reject cycles before anything runs
+    visiting, visited = set(), set()
+    def visit(name: str, path: list[str]):
+        if name in visiting:
+            raise ValueError(f"Dependency cycle between models: {' -> '.join(path + [name])}")
+        if name in visited:
+            return
+        visiting.add(name)
+        for dep in graph[name]:
+            visit(dep, path + [name])
+        visiting.remove(name)
+        visited.add(name)
+
+    for name in graph:
+        visit(name, [])
+    return graph
+
+def _split_workers(starting: list[Type[DeclarativeBase]], free: int) -> dict[str, int]:
+    """
+    Share `free` workers between the models about to start: tasks other than daily ones scrape
+    one unit at a time and take one worker, daily tasks split the rest (at least one each).
+    """
+    daily = [model for model in starting if issubclass(model._scraper, DailyScraper)]
+    free = max(free - (len(starting) - len(daily)), 0)
+    return {model.__name__: max(1, free // len(daily)) if model in daily else 1 for model in starting}
+
+def run_models(models: list[Type[DeclarativeBase]], jobs: int = 1, workers: int = 1,
+               run: Callable[[Type[DeclarativeBase], int], None] = run_task) -> None:
+    """
+    Run the tasks of `models` as a DAG built from each model's `_depends_on`.
+    A model starts once all its dependencies have finished, and at most `jobs` models run at a time.
+    Ties are broken by the order of `models`, so `jobs=1` runs them in routine order.
+    `workers` is the budget of concurrent units (dates) shared by the running models: each model gets
+    a share of the workers not held by running models when it starts, passed to `run(model, workers)`.
+    Models whose dependencies failed are skipped; failures are raised together at the end.
+    """
+    graph = _dependency_graph(models)
+    by_name = {model.__name__: model for model in models}
+    pending = list(by_name)
+    done: set[str] = set()
+    failed: dict[str, BaseException] = {}
+    skipped: list[str] = []
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        running = {}
+        shares: dict[str, int] = {}
+        while pending or running:
+            starting = []
+            for name in list(pending):
+                deps = graph[name]
+                if any(dep in failed or dep in skipped for dep in deps):
+                    print(f"Skipping {name}: dependency failed")
+                    pending.remove(name)
+                    skipped.append(name)
+                elif len(running) + len(starting) < jobs and all(dep in done for dep in deps):
+                    pending.remove(name)
+                    starting.append(by_name[name])
+
+            if starting:
+                shares.update(_split_workers(starting, workers - sum(shares[name] for name in running.values())))
+            for model in starting:
+                name = model.__name__
+                print(f"Start [{name}] with {shares[name]} workers")
+                running[executor.submit(run, model, shares[name])] = name
+
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                shares.pop(name)
+                error = future.exception()
+                if error is None:
+                    print(f"Finished [{name}]")
+                    done.add(name)
+                else:
+                    print(f"Failed [{name}]: {error!r}")
+                    failed[name] = error
+
+    if failed:
+        raise RuntimeError(f"Tasks failed: {', '.join(failed)} (skipped: {', '.join(skipped) or 'none'})") \
+            from next(iter(failed.values()))
@@ -3,9 +3,18 @@ import pandas as pd
 from sqlalchemy.orm import DeclarativeBase
 
 from config.settings import DEFAULT_START_DATES
-from util.db_utils import get_latest_date, ModelFrameMapper
+from util.db_utils import get_latest_date
+from util.db_writer import BackgroundWriter
 from base_class.base_scraper import DateChunkScraper
 
+def resolve_core_start(model: Type[DeclarativeBase]) -> tuple[pd.Timestamp, pd.Timestamp | None]:
+    """
+    Return the start date of the IndexPrice task and its latest stored date (None if the table is empty).
+    """
+    latest = get_latest_date(model.__tablename__)
+    start_date = latest if latest else DEFAULT_START_DATES["IndexPrice"]
+    return start_date, latest
+
 def run_core_task(model: Type[DeclarativeBase]) -> None:
     """
     Run the IndexPrice task. This defines the reference timeline for the entire pipeline.
@@ -14,18 +23,18 @@ def run_core_task(model: Type[DeclarativeBase]) -> None:
     if model.__name__ != "IndexPrice":
         raise ValueError(f"task_core.run_core_task only supports IndexPrice, not {model.__name__}")
 
-    latest = get_latest_date(model.__tablename__)
-    start_date = latest if latest else DEFAULT_START_DATES["IndexPrice"]
+    start_date, latest = resolve_core_start(model)
 
     print(f"scraping [IndexPrice] from {start_date.date()}")
 
     scraper: DateChunkScraper = model._scraper(start_date=start_date)
-    for chunk_df in scraper.run():
+    with BackgroundWriter(model, update_mode='upsert') as writer:
+        for chunk_df in scraper.run():
 
-        if latest is not None:
-            chunk_df = chunk_df[chunk_df["date"] > start_date]
+            if latest is not None:
+                chunk_df = chunk_df[chunk_df["date"] > start_date]
 
-        ModelFrameMapper(model).save_to_sql(chunk_df)
+            writer.submit(chunk_df)
 
 if __name__ == "__main__":
 
@@ -1,19 +1,83 @@
-from typing import Type
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Iterable, Iterator, Type
+import pandas as pd
 from sqlalchemy.orm import DeclarativeBase
 from tqdm import tqdm
 
 from config.settings import DEFAULT_START_DATES
-from util.db_utils import get_latest_date, get_min_date, get_date_serie, ModelFrameMapper
+from util.db_utils import get_latest_date, get_min_date, get_date_serie
+from util.catalog import get_loaded_dates
+from util.db_writer import BackgroundWriter
+from util.journal import unit_key, add_pending_units, start_unit, finish_unit, get_unfinished_units
 from base_class.base_scraper import DailyScraper
+from tasks.create_tables import ensure_partitions
 
 
-def run_daily_task(model: Type[DeclarativeBase]) -> None:
+def _ordered_map(executor: ThreadPoolExecutor, fn: Callable, items: Iterable, window: int) -> Iterator:
+    """
+    Like `executor.map`, but keeps at most `window` items in flight, so finished results
+    wait for earlier ones without the whole input being submitted upfront.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def _scrape_date(model: Type[DeclarativeBase], date: pd.Timestamp) -> tuple[pd.DataFrame | None, list[str]]:
+    """
+    Scrape one date, journaling its start. Returns the scraped rows (None if the scrape raised)
+    and the errors of the attempt.
+    """
+    start_unit(model.__tablename__, unit_key(date))
+    scraper: DailyScraper = model._scraper(date=date)
+    try:
+        return scraper.run(), scraper.errors
+    except Exception as e:
+        print(f"Scraping [{model.__name__}] failed at {date.date()}: {e!r}")
+        return None, scraper.errors + [repr(e)]
+
+def _check_daily_scraper(model: Type[DeclarativeBase], task_name: str):
     if not issubclass(model._scraper, DailyScraper):
         raise ValueError(
-            f"task_daily.run_daily_task only supports DailyScraper, "
+            f"task_daily.{task_name} only supports DailyScraper, "
             f"the scraper of {model.__name__} uses {model._scraper.__bases__[0].__name__}"
         )
 
+def _scrape_dates(model: Type[DeclarativeBase], target_dates: pd.Series, workers: int) -> None:
+    """
+    Scrape `target_dates`, `workers` dates at a time, and write them through the checkpoint journal.
+    A date is journaled done once its rows are committed, or failed if its scrape raised
+    or reported extraction errors.
+    """
+    table_name = model.__tablename__
+    add_pending_units(table_name, [unit_key(date) for date in target_dates])
+
+    failed = []
+    with (BackgroundWriter(model, update_mode='upsert') as writer,
+          ThreadPoolExecutor(max_workers=workers) as executor):
+        results = _ordered_map(executor, lambda date: (date, *_scrape_date(model, date)), target_dates, window=2 * workers)
+        for date, df, errors in tqdm(results, total=len(target_dates), desc=f"Scraping [{model.__name__}]"):
+            error = "; ".join(errors) or None
+            if error is not None:
+                failed.append(date)
+            if df is None:
+                finish_unit(table_name, unit_key(date), error)
+            else: # partial rows of a failed date are kept, the retry upserts over them
+                writer.submit(df, on_commit=partial(finish_unit, table_name, unit_key(date), error))
+
+    if failed:
+        print(f"[{model.__name__}] {len(failed)} dates failed and are journaled for retry: "
+              f"{', '.join(str(date.date()) for date in failed)}")
+
+def resolve_daily_start(model: Type[DeclarativeBase]) -> tuple[pd.Timestamp, pd.Timestamp | None]:
+    """
+    Return the start date of a daily task and the latest stored date (None if the table is empty).
+    """
     default_start = DEFAULT_START_DATES.get(model.__name__, DEFAULT_START_DATES["IndexPrice"])
 
     latest = get_latest_date(model.__tablename__)
@@ -25,10 +89,15 @@ def run_daily_task(model: Type[DeclarativeBase]) -> None:
             start_date = index_min # priority 2: if no data, anchor to the min date in index_price
         else:
             start_date = default_start # priority 3: if index_price min_date < default_start (requesting unavalable date), fallback to the default starting point of web data providers
+    return start_date, latest
 
-    print(f"Scraping [{model.__name__}] from {start_date.date()}")
-
-    date_serie = get_date_serie("index_price")
+def get_daily_target_dates(model: Type[DeclarativeBase], start_date: pd.Timestamp,
+                           latest: pd.Timestamp | None, calendar: pd.Series = None) -> tuple[pd.Series, pd.Series]:
+    """
+    Return the trading dates from `start_date` on, and the earlier dates the checkpoint journal lists as unfinished.
+    Trading dates are those of `index_price`, or of `calendar` if given.
+    """
+    date_serie = calendar if calendar is not None else get_date_serie("index_price")
     if date_serie is None:
         raise RuntimeError("No valid date series found in index_price")
 
@@ -37,13 +106,71 @@ def run_daily_task(model: Type[DeclarativeBase]) -> None:
     else:
         target_dates = date_serie[date_serie >= start_date]
 
-    mapper = ModelFrameMapper(model)
+    unfinished = pd.to_datetime(get_unfinished_units(model.__tablename__))
+    retry_dates = date_serie[date_serie.isin(unfinished) & ~date_serie.isin(target_dates)]
+    return target_dates, retry_dates
+
+def run_daily_task(model: Type[DeclarativeBase], workers: int = 1) -> None:
+    """
+    Scrape every trading date after the latest stored date, plus the dates the checkpoint journal
+    still lists as unfinished, `workers` dates at a time.
+    Requests stay within the per-host limits of `HOST_MAX_CONCURRENCY` and `HOST_RATE_LIMITS`, and an interrupted or
+    partially failed run is completed by the next one.
+    """
+    _check_daily_scraper(model, "run_daily_task")
+
+    start_date, latest = resolve_daily_start(model)
+    print(f"Scraping [{model.__name__}] from {start_date.date()}")
+    ensure_partitions(model.__tablename__, start_date)
+
+    target_dates, retry_dates = get_daily_target_dates(model, start_date, latest)
+    if not retry_dates.empty:
+        print(f"Retrying {len(retry_dates)} unfinished dates of [{model.__name__}] from the journal")
+    target_dates = pd.concat([retry_dates, target_dates]).sort_values(ignore_index=True)
+
+    _scrape_dates(model, target_dates, workers)
+
+def find_date_gaps(model: Type[DeclarativeBase], min_row_ratio: float = None) -> pd.DataFrame:
+    """
+    Compare the loaded dates of a daily table with the `index_price` calendar, between the first and
+    the latest loaded date. Returns the `date`s that are missing, plus with `min_row_ratio` those whose
+    `row_count` is below that fraction of the median row count of the surrounding dates.
+    """
+    loaded = get_loaded_dates(model.__tablename__)
+    if loaded.empty:
+        return pd.DataFrame(columns=["date", "row_count", "reason"])
+
+    calendar = get_date_serie("index_price")
+    if calendar is None:
+        raise RuntimeError("No valid date series found in index_price")
+
+    calendar = calendar[calendar.between(loaded["date"].min(), loaded["date"].max())]
+    missing = pd.DataFrame({"date": calendar[~calendar.isin(loaded["date"])], "row_count": 0, "reason": "missing"})
+    gaps = [missing]
+
+    if min_row_ratio is not None:
+        # rolling median, since the number of listed stocks drifts over the years
+        typical = loaded["row_count"].rolling(21, center=True, min_periods=1).median()
+        low = loaded[loaded["row_count"] < min_row_ratio * typical]
+        gaps.append(low.assign(reason="underpopulated")[["date", "row_count", "reason"]])
+
+    return pd.concat(gaps, ignore_index=True).sort_values("date", ignore_index=True)
+
+def fill_daily_gaps(model: Type[DeclarativeBase], workers: int = 1, min_row_ratio: float = None) -> None:
+    """
+    Rescrape only the missing (and optionally underpopulated) dates found by `find_date_gaps`,
+    `workers` dates at a time.
+    """
+    _check_daily_scraper(model, "fill_daily_gaps")
 
-    for date in tqdm(target_dates, desc=f"Scraping [{model.__name__}]"):
-        scraper: DailyScraper = model._scraper(date=date)
-        df = scraper.run()
-        mapper.save_to_sql(df)
+    gaps = find_date_gaps(model, min_row_ratio)
+    if gaps.empty:
+        print(f"No gaps in [{model.__name__}]")
+        return
 
+    for reason, n_dates in gaps["reason"].value_counts().items():
+        print(f"[{model.__name__}] {n_dates} {reason} dates")
+    _scrape_dates(model, gaps["date"], workers)
 
 
 if __name__ == "__main__":
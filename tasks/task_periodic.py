@@ -1,18 +1,15 @@
 from typing import Type
+import pandas as pd
 from sqlalchemy.orm import DeclarativeBase
 
 from config.settings import DEFAULT_START_DATES
 from util.db_utils import get_latest_date, get_min_date, ModelFrameMapper
 from base_class.base_scraper import PeriodicScraper
 
-def run_periodic_task(model: Type[DeclarativeBase]) -> None:
-    
-    if not issubclass(model._scraper, PeriodicScraper):
-        raise ValueError(
-            f"task_core.run_periodic_task only supports PeriodicScraper, "
-            f"the scraper of {model.__name__} uses {model._scraper.__bases__[0].__name__}"
-        )
-
+def resolve_periodic_start(model: Type[DeclarativeBase]) -> tuple[pd.Timestamp, pd.Timestamp | None]:
+    """
+    Return the start date of a periodic task and the latest stored date (None if the table is empty).
+    """
     latest = get_latest_date(model.__tablename__)
 
     if latest is not None: # start from latest date
@@ -24,6 +21,17 @@ def run_periodic_task(model: Type[DeclarativeBase]) -> None:
                 f"No existing data in `{model.__tablename__}`, and index_price has no timeline to anchor from."
             )
         start_date = index_start
+    return start_date, latest
+
+def run_periodic_task(model: Type[DeclarativeBase]) -> None:
+    
+    if not issubclass(model._scraper, PeriodicScraper):
+        raise ValueError(
+            f"task_core.run_periodic_task only supports PeriodicScraper, "
+            f"the scraper of {model.__name__} uses {model._scraper.__bases__[0].__name__}"
+        )
+
+    start_date, latest = resolve_periodic_start(model)
 
     print(f"scraping [{model.__name__}] from {start_date.date()}")
 
@@ -33,7 +41,7 @@ def run_periodic_task(model: Type[DeclarativeBase]) -> None:
     if latest is not None:
         df = df[df["date"] > start_date]
 
-    ModelFrameMapper(model).save_to_sql(df)
+    ModelFrameMapper(model).save_to_sql(df, update_mode='upsert')
 
 if __name__ == "__main__":
 
@@ -0,0 +1,235 @@
+"""
+Asyncio fetch engine for scrapers that download hundreds of pages per run from one host.
+
+One event loop runs on a background thread for the whole process, with one `httpx.AsyncClient`, so the
+connection pool is reused across dates and across the threads of concurrent daily workers. The number
+of in-flight requests per host adapts AIMD-style, up to the host's `HOST_MAX_CONCURRENCY`: it grows by
+about one per round trip while responses are fast, and halves (at most once per round trip) on
+throttling (429/503), connection errors or responses slower than `ASYNC_FETCH_LATENCY_TARGET`.
+Each request also holds a slot of the host semaphore shared with `ScraperSession`, so sync and async
+scrapers running at once (`--jobs`) stay within `HOST_MAX_CONCURRENCY` together.
+Throttled responses, server errors (`RETRY_STATUS`) and connection errors are retried with backoff.
+Requests also take a token from the host's rate limiter and respect its circuit breaker in
+util/http_utils.py, which counts connection errors and server errors that persist through the retries,
+but not throttling. Responses go through the raw response cache (util/response_cache.py).
+"""
+import asyncio
+import atexit
+import threading
+import time
+from typing import Callable
+
+import httpx
+from requests import Response
+from requests.exceptions import HTTPError
+from requests.utils import get_encoding_from_headers
+
+from config.settings import (USER_AGENT, ASYNC_FETCH_CONCURRENCY, ASYNC_FETCH_LATENCY_TARGET,
+                             ASYNC_FETCH_MAX_ATTEMPTS, ASYNC_FETCH_TIMEOUT, PARSE_POOL_SIZE,
+                             HOST_MAX_CONCURRENCY, DEFAULT_HOST_MAX_CONCURRENCY, RETRY_STATUS)
+from util.http_utils import host_key, host_semaphore, host_bucket, host_breaker, backoff_delay
+from util.response_cache import response_cache
+from util.parse_pool import StageStats, get_parse_pool, get_stage_stats, timed_parse
+
+THROTTLE_STATUS = {429, 503}
+SEMAPHORE_POLL_SECONDS = 0.01
+
+class AIMDLimiter:
+    """
+    Concurrency limit of one host, adapted from the outcome of each request. Used from the event loop only.
+    """
+    def __init__(self, initial: int, minimum: int, maximum: int, latency_target: float):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self.peak = initial
+        self.decreases = 0
+        self._last_decrease = 0.
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, latency: float, congested: bool):
+        async with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if congested or latency > self.latency_target:
+                if now - self._last_decrease > latency: # one decrease per round trip
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._last_decrease = now
+                    self.decreases += 1
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self.peak = max(self.peak, int(self.limit))
+            self._cond.notify_all()
+
+class AsyncFetcher:
+    """
+    Process-wide fetch engine. `fetch_and_parse` is called from ordinary (non-async) code.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._client: httpx.AsyncClient | None = None
+        self._limiters: dict[str, AIMDLimiter] = {}
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="async-fetch", daemon=True).start()
+                atexit.register(self.close)
+        return self._loop
+
+    def _limiter(self, key: str) -> AIMDLimiter:
+        if key not in self._limiters:
+            maximum = min(ASYNC_FETCH_CONCURRENCY["max"], HOST_MAX_CONCURRENCY.get(key, DEFAULT_HOST_MAX_CONCURRENCY))
+            self._limiters[key] = AIMDLimiter(min(ASYNC_FETCH_CONCURRENCY["initial"], maximum),
+                                              min(ASYNC_FETCH_CONCURRENCY["min"], maximum),
+                                              maximum, ASYNC_FETCH_LATENCY_TARGET)
+        return self._limiters[key]
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            limits = httpx.Limits(max_connections=ASYNC_FETCH_CONCURRENCY["max"],
+                                  max_keepalive_connections=ASYNC_FETCH_CONCURRENCY["max"])
+            self._client = httpx.AsyncClient(headers={"user-agent": USER_AGENT}, limits=limits,
+                                             timeout=ASYNC_FETCH_TIMEOUT, follow_redirects=True)
+        return self._client
+
+    @staticmethod
+    async def _acquire_host(key: str):
+        """
+        Take a slot of the process-wide host semaphore shared with `ScraperSession`, without blocking the event loop.
+        """
+        semaphore = host_semaphore(key)
+        while not semaphore.acquire(blocking=False):
+            await asyncio.sleep(SEMAPHORE_POLL_SECONDS)
+
+    async def _fetch(self, url: str, params: dict | None, stats: StageStats,
+                     in_flight: dict[str, list[int]]) -> httpx.Response | Response:
+        if response_cache.mode != "off":
+            cache_request = response_cache.prepare("GET", url, params)
+            if response_cache.mode == "replay":
+                return response_cache.load(cache_request)
+
+        key = host_key(url)
+        limiter = self._limiter(key)
+        breaker = host_breaker(key)
+        for attempt in range(1, ASYNC_FETCH_MAX_ATTEMPTS + 1):
+            breaker.check()
+            await limiter.acquire()
+            start, congested, response, acquired = time.monotonic(), True, None, False
+            try:
+                await self._acquire_host(key)
+                acquired = True
+                counts = in_flight.setdefault(key, [0, 0]) # in flight, peak of this run
+                counts[0] += 1
+                counts[1] = max(counts[1], counts[0])
+                await asyncio.sleep(host_bucket(key).reserve())
+                start = time.monotonic()
+                response = await self._get_client().get(url, params=params)
+                congested = response.status_code in THROTTLE_STATUS
+            except httpx.TransportError: # connection errors and timeouts
+                breaker.record(False)
+                if attempt == ASYNC_FETCH_MAX_ATTEMPTS:
+                    raise
+            except asyncio.CancelledError: # another page failed, not this host
+                breaker.abandon()
+                raise
+            finally:
+                if acquired:
+                    host_semaphore(key).release()
+                    in_flight[key][0] -= 1
+                latency = time.monotonic() - start
+                stats.add("fetch", latency)
+                await limiter.release(latency, congested)
+
+            if response is None:
+                await asyncio.sleep(backoff_delay(attempt))
+                continue
+            if response.status_code not in RETRY_STATUS:
+                breaker.record(True)
+                break
+            # throttling only slows the host down (AIMD); server errors count once their retries are used up
+            if attempt < ASYNC_FETCH_MAX_ATTEMPTS or congested:
+                breaker.abandon()
+            else:
+                breaker.record(False)
+            if attempt == ASYNC_FETCH_MAX_ATTEMPTS:
+                break
+            await asyncio.sleep(backoff_delay(attempt, response.headers.get("Retry-After")))
+
+        if response.status_code != 200:
+            raise HTTPError(f'request of {params} fails, status code: {response.status_code}, url: {response.url}')
+        if response_cache.mode == "record":
+            response_cache.store(cache_request, response.status_code, response.headers,
+                                 get_encoding_from_headers(response.headers), response.url, response.content)
+        return response
+
+    async def _fetch_and_parse(self, requests: list[tuple[str, dict | None]], parse: Callable,
+                               parse_args: list[tuple], stats_name: str) -> list:
+        stats = get_stage_stats(stats_name)
+        parse_pool = get_parse_pool()
+        in_flight: dict[str, list[int]] = {}
+
+        async def fetch_one(i: int):
+            url, params = requests[i]
+            response = await self._fetch(url, params, stats, in_flight)
+            # pick the encoding the way `requests` does, so both fetch paths decode pages alike
+            encoding = response.encoding if isinstance(response, Response) else get_encoding_from_headers(response.headers)
+            args = (response.content, encoding, *parse_args[i], str(response.url))
+            return asyncio.wrap_future(parse_pool.submit(timed_parse, parse, args))
+
+        try: # a failed page cancels the remaining fetches
+            async with asyncio.TaskGroup() as group:
+                tasks = [group.create_task(fetch_one(i)) for i in range(len(requests))]
+        except ExceptionGroup as e:
+            raise e.exceptions[0]
+
+        parse_futures = [task.result() for task in tasks]
+        results = []
+        for result, seconds in await asyncio.gather(*parse_futures):
+            stats.add("parse", seconds)
+            results.append(result)
+        return results, {key: peak for key, (_, peak) in in_flight.items()}
+
+    def fetch_and_parse(self, requests: list[tuple[str, dict | None]], parse: Callable,
+                        parse_args: list[tuple], stats_name: str) -> list:
+        """
+        Fetch every `(url, params)` of `requests` on the event loop, and run
+        `parse(content, encoding, *parse_args[i], url)` for each page on the parse pool (see util/parse_pool.py).
+        Results are returned in input order; a page that still fails after retries raises.
+        """
+        started = time.perf_counter()
+        coro = self._fetch_and_parse(requests, parse, parse_args, stats_name)
+        results, peaks = asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+        # fetch capacity of this run: the peak number of its own requests in flight, summed over hosts
+        get_stage_stats(stats_name).add_run(time.perf_counter() - started, len(requests),
+                                            sum(peaks.values()), PARSE_POOL_SIZE)
+        return results
+
+    def report(self):
+        """
+        Print the current and peak concurrency of each host.
+        """
+        for key, limiter in list(self._limiters.items()):
+            print(f"[async fetch] {key}: concurrency {int(limiter.limit)} (peak {limiter.peak}), "
+                  f"decreased {limiter.decreases} times")
+
+    def close(self):
+        if self._loop is None:
+            return
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._client, self._loop = None, None
+
+async_fetcher = AsyncFetcher()
@@ -0,0 +1,184 @@
+"""
+Ingestion catalog: per-table watermarks (`ingestion_watermark`) and loaded dates (`ingestion_date`).
+
+`save_to_sql` updates both in the same transaction as the data write, so task start-up can read
+the date range of a table without scanning it. `rebuild_catalog` / `verify_catalog` are the
+repair path that re-derives the catalog from the data table itself. Within `read_only_catalog()`
+(the `--plan` dry run), lookups never write: tables missing from the catalog are scanned instead of
+rebuilt, and tables missing from the database read as empty.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import pandas as pd
+import psycopg
+
+from util.db_pool import db_pool
+
+WATERMARK_TABLE = "ingestion_watermark"
+DATE_TABLE = "ingestion_date"
+
+_read_only = ContextVar("catalog_read_only", default=False)
+
+@contextmanager
+def read_only_catalog():
+    """
+    Make the catalog lookups of the block read-only, for dry runs on a database that may be empty or not created yet.
+    """
+    token = _read_only.set(True)
+    try:
+        yield
+    finally:
+        _read_only.reset(token)
+
+def table_exists(conn: psycopg.Connection, table_name: str) -> bool:
+    return conn.execute("SELECT to_regclass(%s) IS NOT NULL", (table_name,)).fetchone()[0]
+
+def update_catalog(cursor: psycopg.Cursor, table_name: str, dates: list | None, replace: bool = False):
+    """
+    Refresh the catalog rows of `table_name` after a write, inside the caller's transaction.
+    `dates` are the dates touched by the write (None for tables without a `date` column).
+    """
+    if dates is None:
+        cursor.execute(f"""
+            INSERT INTO {WATERMARK_TABLE} (table_name, min_date, max_date, row_count, updated_at)
+            SELECT %(table)s, NULL, NULL, count(*), now() FROM {table_name}
+            ON CONFLICT (table_name) DO UPDATE SET
+                row_count = EXCLUDED.row_count, updated_at = EXCLUDED.updated_at
+        """, {"table": table_name})
+        return
+
+    if replace:
+        cursor.execute(f"DELETE FROM {DATE_TABLE} WHERE table_name = %s", (table_name,))
+
+    cursor.execute(f"""
+        INSERT INTO {DATE_TABLE} (table_name, date, row_count, loaded_at)
+        SELECT %(table)s, date, count(*), now() FROM {table_name}
+        WHERE date = ANY(%(dates)s)
+        GROUP BY date
+        ON CONFLICT (table_name, date) DO UPDATE SET
+            row_count = EXCLUDED.row_count, loaded_at = EXCLUDED.loaded_at
+    """, {"table": table_name, "dates": list(dates)})
+    _refresh_watermark(cursor, table_name)
+
+def _refresh_watermark(cursor: psycopg.Cursor, table_name: str):
+    cursor.execute(f"""
+        INSERT INTO {WATERMARK_TABLE} (table_name, min_date, max_date, row_count, updated_at)
+        SELECT %(table)s, min(date), max(date), coalesce(sum(row_count), 0), now()
+        FROM {DATE_TABLE} WHERE table_name = %(table)s
+        ON CONFLICT (table_name) DO UPDATE SET
+            min_date = EXCLUDED.min_date, max_date = EXCLUDED.max_date,
+            row_count = EXCLUDED.row_count, updated_at = EXCLUDED.updated_at
+    """, {"table": table_name})
+
+def _scan_date_counts(cursor: psycopg.Cursor, table_name: str) -> dict:
+    cursor.execute(f"SELECT date, count(*) FROM {table_name} GROUP BY date")
+    return dict(cursor.fetchall())
+
+def rebuild_catalog(table_name: str):
+    """
+    Repair path: re-derive the catalog of a dated table by scanning the table itself.
+    """
+    with db_pool.connection() as conn, conn.cursor() as cur:
+        date_counts = _scan_date_counts(cur, table_name)
+        cur.execute(f"DELETE FROM {DATE_TABLE} WHERE table_name = %s", (table_name,))
+        with cur.copy(f"COPY {DATE_TABLE} (table_name, date, row_count, loaded_at) FROM STDIN") as copy:
+            loaded_at = pd.Timestamp.now().to_pydatetime()
+            for date, row_count in date_counts.items():
+                copy.write_row((table_name, date, row_count, loaded_at))
+        _refresh_watermark(cur, table_name)
+
+def verify_catalog(table_name: str) -> bool:
+    """
+    Verify path: compare the catalog of a dated table against a scan of the table.
+    """
+    with db_pool.connection() as conn, conn.cursor() as cur:
+        date_counts = _scan_date_counts(cur, table_name)
+        cur.execute(f"SELECT date, row_count FROM {DATE_TABLE} WHERE table_name = %s", (table_name,))
+        return dict(cur.fetchall()) == date_counts
+
+def get_watermark(table_name: str) -> dict:
+    """
+    Return `{min_date, max_date, row_count, updated_at}` of a dated table.
+    Tables that were loaded before the catalog existed are rebuilt from a scan on first access.
+    """
+    query = f"SELECT min_date, max_date, row_count, updated_at FROM {WATERMARK_TABLE} WHERE table_name = %s"
+    if _read_only.get():
+        with db_pool.connection() as conn:
+            row = _peek_watermark(conn, query, table_name)
+    else:
+        with db_pool.connection() as conn:
+            row = conn.execute(query, (table_name,)).fetchone()
+        if row is None:
+            rebuild_catalog(table_name)
+            with db_pool.connection() as conn:
+                row = conn.execute(query, (table_name,)).fetchone()
+
+    min_date, max_date, row_count, updated_at = row
+    return {
+        "min_date": pd.Timestamp(min_date) if min_date is not None else None,
+        "max_date": pd.Timestamp(max_date) if max_date is not None else None,
+        "row_count": row_count,
+        "updated_at": pd.Timestamp(updated_at) if updated_at is not None else None,
+    }
+
+def _peek_watermark(conn: psycopg.Connection, query: str, table_name: str) -> tuple:
+    if table_exists(conn, WATERMARK_TABLE):
+        row = conn.execute(query, (table_name,)).fetchone()
+        if row is not None:
+            return row
+    if not table_exists(conn, table_name):
+        return None, None, 0, None
+    return conn.execute(f"SELECT min(date), max(date), count(*), NULL FROM {table_name}").fetchone()
+
+def get_updated_at(table_name: str) -> pd.Timestamp | None:
+    """
+    Time of the last catalogued write to any table (dated or not), or None if it was never written.
+    """
+    query = f"SELECT updated_at FROM {WATERMARK_TABLE} WHERE table_name = %s"
+    with db_pool.connection() as conn:
+        row = conn.execute(query, (table_name,)).fetchone()
+    return pd.Timestamp(row[0]) if row is not None else None
+
+def get_loaded_dates(table_name: str, loaded_after: pd.Timestamp | None = None) -> pd.DataFrame:
+    """
+    Return the loaded dates of a dated table with their row counts and load times, ordered by date.
+    With `loaded_after`, only dates (re)loaded after that time are returned.
+    """
+    query = f"SELECT date, row_count, loaded_at FROM {DATE_TABLE} WHERE table_name = %s"
+    params = [table_name]
+    if loaded_after is not None:
+        query += " AND loaded_at > %s"
+        params.append(loaded_after.to_pydatetime())
+    if _read_only.get():
+        with db_pool.connection() as conn:
+            rows = _peek_loaded_dates(conn, query + " ORDER BY date", params, table_name)
+    else:
+        get_watermark(table_name) # make sure the catalog of the table exists
+        with db_pool.connection() as conn:
+            rows = conn.execute(query + " ORDER BY date", params).fetchall()
+    df = pd.DataFrame(rows, columns=["date", "row_count", "loaded_at"])
+    df["date"] = pd.to_datetime(df["date"])
+    return df
+
+def _peek_loaded_dates(conn: psycopg.Connection, query: str, params: list, table_name: str) -> list:
+    if table_exists(conn, DATE_TABLE):
+        rows = conn.execute(query, params).fetchall()
+        if rows:
+            return rows
+    if not table_exists(conn, table_name):
+        return []
+    return conn.execute(f"SELECT date, count(*), NULL FROM {table_name} GROUP BY date ORDER BY date").fetchall()
+
+if __name__ == "__main__":
+
+    from models import Base
+
+    dated_tables = [name for name, table in Base.metadata.tables.items()
+                    if "date" in table.columns and name != DATE_TABLE]
+    for table_name in dated_tables:
+        if verify_catalog(table_name):
+            print(f"{table_name}: catalog OK")
+        else:
+            print(f"{table_name}: catalog out of date, rebuilding")
+            rebuild_catalog(table_name)
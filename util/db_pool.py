@@ -0,0 +1,106 @@
+import atexit
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+import psycopg
+from psycopg_pool import ConnectionPool
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+
+from config.settings import SQLALCHEMY_DATABASE_URL, DB_DSN, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE
+
+class ConnectionManager:
+    """
+    Process-wide owner of the psycopg connection pool and the SQLAlchemy engine.
+    Both are created lazily on first use and share the same size limits.
+    """
+
+    def __init__(self, dsn: str = DB_DSN, url: str = SQLALCHEMY_DATABASE_URL,
+                 min_size: int = DB_POOL_MIN_SIZE, max_size: int = DB_POOL_MAX_SIZE):
+        self.dsn = dsn
+        self.url = url
+        self.min_size = min_size
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._pool: ConnectionPool | None = None
+        self._engine: Engine | None = None
+        self._engine_counts = {"connections_opened": 0, "checkouts": 0}
+
+    @property
+    def pool(self) -> ConnectionPool:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ConnectionPool(self.dsn, min_size=self.min_size, max_size=self.max_size,
+                                            name="twstock-db", open=True)
+        return self._pool
+
+    @property
+    def engine(self) -> Engine:
+        with self._lock:
+            if self._engine is None:
+                engine = create_engine(self.url, pool_size=self.max_size, max_overflow=0, pool_pre_ping=True)
+                event.listen(engine, "connect", self._on_engine_connect)
+                event.listen(engine, "checkout", self._on_engine_checkout)
+                self._engine = engine
+        return self._engine
+
+    def _on_engine_connect(self, dbapi_connection, connection_record):
+        self._engine_counts["connections_opened"] += 1
+
+    def _on_engine_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self._engine_counts["checkouts"] += 1
+
+    @contextmanager
+    def connection(self) -> Iterator[psycopg.Connection]:
+        """
+        Borrow a psycopg connection from the pool.
+        The transaction is committed on exit, or rolled back if an exception is raised.
+        """
+        with self.pool.connection() as conn:
+            yield conn
+
+    def stats(self) -> dict:
+        """
+        Reuse counters for both pools: `reused` is the number of requests served without a new connection.
+        """
+        pool_stats = self._pool.get_stats() if self._pool is not None else {}
+        requests_num = pool_stats.get("requests_num", 0)
+        connections_num = pool_stats.get("connections_num", 0)
+        checkouts = self._engine_counts["checkouts"]
+        engine_opened = self._engine_counts["connections_opened"]
+        return {
+            "psycopg": {
+                "pool_size": pool_stats.get("pool_size", 0),
+                "pool_available": pool_stats.get("pool_available", 0),
+                "requests": requests_num,
+                "connections_opened": connections_num,
+                "reused": max(requests_num - connections_num, 0),
+                "requests_wait_ms": pool_stats.get("requests_wait_ms", 0),
+            },
+            "sqlalchemy": {
+                "checkouts": checkouts,
+                "connections_opened": engine_opened,
+                "reused": max(checkouts - engine_opened, 0),
+            },
+        }
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool = None
+            if self._engine is not None:
+                self._engine.dispose()
+                self._engine = None
+
+db_pool = ConnectionManager()
+atexit.register(db_pool.close)
+
+if __name__ == "__main__":
+
+    with db_pool.connection() as conn:
+        print(conn.execute("SELECT 1").fetchone())
+    with db_pool.connection() as conn:
+        print(conn.execute("SELECT 1").fetchone())
+    print(db_pool.stats())
@@ -1,17 +1,49 @@
+import csv
+import numpy as np
 import pandas as pd
 import warnings
-from io import BytesIO
-from typing import Type
+from contextlib import contextmanager
+from io import BytesIO, BufferedReader, RawIOBase
+from typing import Iterator, Type
 
 import psycopg
-from sqlalchemy import create_engine,inspect
+from sqlalchemy import inspect
 from sqlalchemy import DateTime, String, Integer, Float, REAL, BigInteger
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import DeclarativeBase
 
-from config.settings import SQLALCHEMY_DATABASE_URL, DB_DSN
+from config.settings import DB_DSN
+from util.db_pool import db_pool
+from util.catalog import update_catalog, get_watermark, get_loaded_dates, table_exists
 
-def get_engine():
-    return create_engine(SQLALCHEMY_DATABASE_URL)
+def get_engine() -> Engine:
+    return db_pool.engine
+
+@contextmanager
+def get_connection(dsn: str | None = None) -> Iterator[psycopg.Connection]:
+    """
+    Borrow a pooled psycopg connection, or open a dedicated one when a custom `dsn` is given.
+    The transaction is committed on exit, or rolled back if an exception is raised.
+    """
+    if dsn is None or dsn == DB_DSN:
+        with db_pool.connection() as conn:
+            yield conn
+    else:
+        with psycopg.connect(dsn) as conn:
+            yield conn
+
+@contextmanager
+def _engine_connection(engine: Engine):
+    """Borrow the DBAPI connection of a SQLAlchemy engine, with the same commit/rollback semantics."""
+    conn = engine.raw_connection()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
 
 def _copy_to_buffer(cursor: psycopg.Cursor, query: str) -> BytesIO:
     buffer = BytesIO()
@@ -21,51 +53,102 @@ def _copy_to_buffer(cursor: psycopg.Cursor, query: str) -> BytesIO:
     buffer.seek(0)
     return buffer
 
-def read_sql_fast(query_str: str, dsn: str = DB_DSN) -> pd.DataFrame:
+def _to_copy_columns(df: pd.DataFrame) -> list[np.ndarray]:
+    """Convert each column to an object array of Python values, with missing values as None."""
+    columns = []
+    for name in df.columns:
+        s = df[name]
+        if pd.api.types.is_datetime64_any_dtype(s):
+            values = np.array(s.dt.to_pydatetime(), dtype=object)
+            values[s.isna().to_numpy()] = None
+        else:
+            values = s.to_numpy(dtype=object, na_value=None)
+        columns.append(values)
+    return columns
+
+def copy_from_dataframe(cursor: psycopg.Cursor, table_name: str, df: pd.DataFrame, pg_types: list[str]):
+    """Write a DataFrame into `table_name` using PostgreSQL binary COPY."""
+    columns = ", ".join(df.columns)
+    with cursor.copy(f"COPY {table_name} ({columns}) FROM STDIN (FORMAT BINARY)") as copy:
+        copy.set_types(pg_types)
+        for row in zip(*_to_copy_columns(df)):
+            copy.write_row(row)
+
+def read_sql_fast(query_str: str, dsn: str | None = None) -> pd.DataFrame:
     """Read a SQL query into a DataFrame quickly using PostgreSQL COPY."""
-    with psycopg.connect(dsn) as conn, conn.cursor() as cur:
+    with get_connection(dsn) as conn, conn.cursor() as cur:
         buffer = _copy_to_buffer(cur, query_str)
         df = pd.read_csv(buffer)
     return df
 
-def get_latest_date(table_name: str) -> pd.Timestamp | None:
+class _CopyStream(RawIOBase):
+    """
+    Read-only file object over a `COPY ... TO STDOUT` stream.
+    Data is pulled from the server only as the reader consumes it.
+    """
+    def __init__(self, copy: psycopg.Copy):
+        self._chunks = iter(copy)
+        self._pending = memoryview(b"")
 
-    query = f"SELECT MAX(date) AS latest FROM {table_name}"
-    df = read_sql_fast(query)
-    if df.empty: 
-        return None
-    else:
-        latest = df["latest"].iloc[0]
-        return pd.to_datetime(latest) if pd.notna(latest) else None
+    def readable(self) -> bool:
+        return True
 
+    def readinto(self, b) -> int:
+        while not self._pending:
+            try:
+                self._pending = memoryview(next(self._chunks))
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._pending))
+        b[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
 
-def get_min_date(table_name: str) -> pd.Timestamp | None:
+def read_sql_iter(query_str: str, chunksize: int = 100_000, dtypes: dict = None, dsn: str | None = None) -> Iterator[pd.DataFrame]:
+    """
+    Yield the result of a SQL query as DataFrames of at most `chunksize` rows.
+    Rows are parsed while the COPY stream is still arriving, so memory stays bounded by one chunk.
+    """
+    dtypes = dtypes or {}
+    with get_connection(dsn) as conn, conn.cursor() as cur:
+        with cur.copy(f"COPY ({query_str}) TO STDOUT WITH CSV HEADER") as copy:
+            stream = BufferedReader(_CopyStream(copy))
+            columns = next(csv.reader([stream.readline().decode()]))
+            dtype_in_col = {col: dtype for col, dtype in dtypes.items() if col in columns}
+            date_cols = [col for col, dtype in dtype_in_col.items() if dtype.startswith("datetime64")]
+            csv_dtypes = {col: dtype for col, dtype in dtype_in_col.items() if col not in date_cols}
 
-    query = f"SELECT MIN(date) AS mindate FROM {table_name}"
-    df = read_sql_fast(query)
-    if df.empty: 
-        return None
-    else:
-        mindate = df["mindate"].iloc[0]
-        return pd.to_datetime(mindate) if pd.notna(mindate) else None
+            with pd.read_csv(stream, names=columns, header=None, dtype=csv_dtypes,
+                             parse_dates=date_cols, chunksize=chunksize) as reader:
+                for df in reader:
+                    yield df.astype(dtype_in_col)
+
+def get_latest_date(table_name: str) -> pd.Timestamp | None:
+    """
+    Latest loaded date of `table_name`, read from the ingestion catalog.
+    """
+    return get_watermark(table_name)["max_date"]
+
+def get_min_date(table_name: str) -> pd.Timestamp | None:
+    """
+    Earliest loaded date of `table_name`, read from the ingestion catalog.
+    """
+    return get_watermark(table_name)["min_date"]
 
 def get_date_serie(table_name: str) -> pd.Series | None:
-    
-    query = f"SELECT DISTINCT date FROM {table_name} ORDER BY date"
-    df = read_sql_fast(query)
-    if df.empty or "date" not in df.columns:
-        return None
-    else:
-        date_series = pd.to_datetime(df["date"])
-        return date_series if not date_series.empty else None
+    """
+    All loaded dates of `table_name` in ascending order, read from the ingestion catalog.
+    """
+    date_series = get_loaded_dates(table_name)["date"]
+    return date_series if not date_series.empty else None
 
 def table_has_data(table_name: str) -> bool:
     """
-    Check if the given table contains any rows.
+    Check if the given table contains any rows (False if it does not exist yet).
     """
     query = f"SELECT EXISTS (SELECT 1 FROM {table_name} LIMIT 1) AS has_data"
-    df = pd.read_sql(query, SQLALCHEMY_DATABASE_URL)
-    return df['has_data'].iloc[0]
+    with get_connection() as conn:
+        return table_exists(conn, table_name) and conn.execute(query).fetchone()[0]
 
 
 class ModelFrameMapper:
@@ -120,16 +203,106 @@ class ModelFrameMapper:
                 sqlalchemy_dtype_mapping[column.name] = String(column.type.length)
         return sqlalchemy_dtype_mapping
 
+    @property
+    def pg_types(self) -> dict:
+        """
+        Extracts PostgreSQL type names for binary `COPY`.
+        """
+        pg_type_mapping = {}
+        for column in self.model.__table__.columns:
+            col_type = column.type
+            if isinstance(col_type, BigInteger):
+                pg_type_mapping[column.name] = "int8"
+            elif isinstance(col_type, Integer):
+                pg_type_mapping[column.name] = "int4"
+            elif isinstance(col_type, REAL):
+                pg_type_mapping[column.name] = "float4"
+            elif isinstance(col_type, Float):
+                pg_type_mapping[column.name] = "float8"
+            elif isinstance(col_type, DateTime):
+                pg_type_mapping[column.name] = "timestamp"
+            elif isinstance(col_type, String):
+                pg_type_mapping[column.name] = "varchar"
+        return pg_type_mapping
+
     def cast_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         Casts a DataFrame to match the SQLAlchemy model's dtypes.
         """
         return df.astype(self.pandas_dtypes)
 
-    def save_to_sql(self, df: pd.DataFrame, engine = get_engine(), update_mode = 'append'):
+    @property
+    def primary_keys(self) -> list[str]:
+        """
+        Primary key column names of the SQLAlchemy model.
+        """
+        return [column.name for column in self.model.__table__.primary_key.columns]
+
+    def _loaded_dates(self, df: pd.DataFrame) -> list | None:
+        """
+        Distinct dates in the DataFrame, or None if the model has no `date` column.
+        """
+        if "date" not in self.model.__table__.columns:
+            return None
+        return list(df["date"].drop_duplicates().dt.to_pydatetime())
+
+    def _upsert_from_stage(self, cursor: psycopg.Cursor, df: pd.DataFrame, pg_types: list[str]):
+        """
+        COPYs the DataFrame into a temporary staging table, then merges it into the
+        model table with `INSERT ... ON CONFLICT (pk) DO UPDATE`.
+        """
+        table_name = self.model.__tablename__
+        stage_name = f"_stage_{table_name}"
+        pk_str = ", ".join(self.primary_keys)
+        columns = ", ".join(df.columns)
+
+        update_cols = [col for col in df.columns if col not in self.primary_keys]
+        if update_cols:
+            conflict_action = "DO UPDATE SET " + ", ".join(f"{col} = EXCLUDED.{col}" for col in update_cols)
+        else:
+            conflict_action = "DO NOTHING"
+
+        cursor.execute(f"CREATE TEMP TABLE {stage_name} (LIKE {table_name} INCLUDING DEFAULTS) ON COMMIT DROP")
+        copy_from_dataframe(cursor, stage_name, df, pg_types)
+        cursor.execute(f"""
+            INSERT INTO {table_name} ({columns})
+            SELECT {columns} FROM {stage_name}
+            ON CONFLICT ({pk_str}) {conflict_action}
+        """)
+
+    def _copy_to_sql(self, df: pd.DataFrame, engine: Engine | None, update_mode: str):
+        """
+        Writes the DataFrame with binary `COPY` in a single transaction.
+        `replace` truncates the table first, keeping its schema and primary key.
+        `upsert` merges through a staging table on the model's primary key.
+        """
+        table_name = self.model.__tablename__
+        pg_types = [self.pg_types[col] for col in df.columns]
+
+        conn_ctx = get_connection() if engine is None else _engine_connection(engine)
+        with conn_ctx as conn, conn.cursor() as cur:
+            if update_mode == 'replace':
+                cur.execute(f"TRUNCATE {table_name}")
+            if update_mode == 'upsert':
+                self._upsert_from_stage(cur, df, pg_types)
+            else:
+                copy_from_dataframe(cur, table_name, df, pg_types)
+            update_catalog(cur, table_name, self._loaded_dates(df), replace=(update_mode == 'replace'))
+
+    def save_to_sql(self, df: pd.DataFrame, engine: Engine | None = None, update_mode = 'append', method = 'copy'):
         """
         Saves the DataFrame to SQL with the correct dtypes.
+        Uses the shared connection pool unless an `engine` is given.
+
+        `method='copy'` writes through binary `COPY`, `method='to_sql'` falls back to `DataFrame.to_sql`.
+        `update_mode='upsert'` overwrites rows sharing a primary key, so reruns are idempotent (`copy` only).
+        The ingestion catalog is updated in the same transaction as the write.
         """
+        if update_mode not in ('append', 'replace', 'upsert'):
+            raise ValueError(f"Unsupported update_mode: {update_mode}")
+        if update_mode == 'upsert' and method != 'copy':
+            raise ValueError("update_mode='upsert' is only supported with method='copy'")
+
         non_nullable_columns = [column.name for column in inspect(self.model).columns if not column.nullable]
         nan_rows = df[df[non_nullable_columns].isna().any(axis=1)]
 
@@ -140,20 +313,32 @@ class ModelFrameMapper:
         df = df.dropna(subset=non_nullable_columns, ignore_index=True)
         df = self.cast_dataframe(df)
 
+        if update_mode == 'upsert': # ON CONFLICT cannot update the same row twice in one statement
+            df = df.drop_duplicates(subset=self.primary_keys, keep='last', ignore_index=True)
+
         if df.empty:
             print(f"No valid rows to insert into `{self.model.__tablename__}`. Skipping.")
             return
         
         print(f"{update_mode} table: {self.model.__tablename__}\n{df.head()}\n...\n{df.tail()}")
-        df.to_sql(
-            self.model.__tablename__,
-            con=engine,
-            if_exists=update_mode,
-            index=False,
-            dtype=self.sqlalchemy_dtypes
-        )
+        if method == 'copy':
+            self._copy_to_sql(df, engine, update_mode)
+        elif method == 'to_sql':
+            with (engine or get_engine()).begin() as conn:
+                df.to_sql(
+                    self.model.__tablename__,
+                    con=conn,
+                    if_exists=update_mode,
+                    index=False,
+                    dtype=self.sqlalchemy_dtypes
+                )
+                with conn.connection.cursor() as cur:
+                    update_catalog(cur, self.model.__tablename__, self._loaded_dates(df),
+                                   replace=(update_mode == 'replace'))
+        else:
+            raise ValueError(f"Unsupported save method: {method}")
     
-    def read_sql(self, query_str=None, dsn: str = DB_DSN):
+    def read_sql(self, query_str=None, dsn: str | None = None):
         
         df = read_sql_fast(query_str, dsn)
         dtype_in_col = {col: dtype for col, dtype in self.pandas_dtypes.items() if col in df.columns}
@@ -161,6 +346,12 @@ class ModelFrameMapper:
         
         return df
 
+    def iter_sql(self, query_str: str, chunksize: int = 100_000, dsn: str | None = None) -> Iterator[pd.DataFrame]:
+        """
+        Streaming variant of `read_sql`, yielding DataFrames of at most `chunksize` rows.
+        """
+        yield from read_sql_iter(query_str, chunksize, self.pandas_dtypes, dsn)
+
 if __name__ == "__main__":
 
     print(table_has_data("index_price"))
\ No newline at end of file
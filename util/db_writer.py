@@ -0,0 +1,87 @@
+import queue
+import threading
+from typing import Callable, Type
+
+import pandas as pd
+from sqlalchemy.orm import DeclarativeBase
+
+from config.settings import WRITER_MAX_PENDING, WRITER_MAX_BATCH_ROWS
+from util.db_utils import ModelFrameMapper
+
+_STOP = object()
+
+class BackgroundWriter:
+    """
+    Saves DataFrames of one model from a background thread, so that scraping the next unit
+    overlaps with writing the previous one.
+
+    - `submit` blocks once `max_pending` frames are queued (back-pressure on the scraping loop).
+    - Frames queued while a write is in progress are coalesced into one COPY transaction,
+      up to `max_batch_rows` rows.
+    - Leaving the `with` block flushes the queue; a write error is raised there, or at the next `submit`.
+    """
+    def __init__(self, model: Type[DeclarativeBase], update_mode: str = 'upsert',
+                 max_pending: int = WRITER_MAX_PENDING, max_batch_rows: int = WRITER_MAX_BATCH_ROWS):
+        self.mapper = ModelFrameMapper(model)
+        self.update_mode = update_mode
+        self.max_batch_rows = max_batch_rows
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error: BaseException | None = None
+        self._thread = threading.Thread(target=self._run, name=f"writer-{model.__tablename__}", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._queue.put(_STOP)
+        self._thread.join()
+        if exc_type is None:
+            self._raise_if_failed()
+
+    def submit(self, df: pd.DataFrame, on_commit: Callable[[], None] = None):
+        """
+        Queue a DataFrame for writing. `on_commit` is called once its rows are committed.
+        """
+        self._raise_if_failed()
+        self._queue.put((df, on_commit))
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise RuntimeError(f"background write to `{self.mapper.model.__tablename__}` failed") from self._error
+
+    def _next_batch(self) -> tuple[list, bool]:
+        """
+        Block for one item, then take whatever else is already queued. Returns (batch, stop).
+        """
+        item = self._queue.get()
+        if item is _STOP:
+            return [], True
+
+        batch = [item]
+        n_rows = len(item[0])
+        while n_rows < self.max_batch_rows:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+            n_rows += len(item[0])
+        return batch, False
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch, stop = self._next_batch()
+            if not batch or self._error is not None: # after a failure, keep draining so `submit` never blocks forever
+                continue
+            try:
+                df = pd.concat([df for df, _ in batch if not df.empty] or [batch[0][0]], ignore_index=True)
+                self.mapper.save_to_sql(df, update_mode=self.update_mode)
+                for _, on_commit in batch:
+                    if on_commit is not None:
+                        on_commit()
+            except BaseException as e:
+                self._error = e
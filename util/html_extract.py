@@ -0,0 +1,154 @@
+"""
+Targeted lxml extraction of the HTML pages scraped in bulk, replacing `pd.read_html`.
+
+`pd.read_html` builds a DataFrame of every matching table, with type inference, for each page.
+The extractors below walk the rows with precompiled XPath expressions and collect only the needed
+cells and links into column lists, so a scraper can merge the lists of a whole batch of pages
+and build one DataFrame. Values are returned as stripped strings; typing is left to the caller.
+
+Benchmark against the `read_html` path on the pages recorded in the raw response cache
+(`HTTP_CACHE_MODE=record`, see util/response_cache.py):
+
+    python -m util.html_extract
+"""
+import re
+
+from lxml import etree, html
+
+_broker_tables = etree.XPath("//table[@class='t0']")
+_revenue_table = etree.XPath("//table[@id='oMainTable']")
+_isin_rows = etree.XPath("(//tr[count(td) = 7])[1]/../tr") # rows of the table of the header row
+_rows = etree.XPath("tr | tbody/tr | thead/tr")
+_cells = etree.XPath("td | th")
+_links = etree.XPath(".//a/@href")
+
+_etf_link = re.compile(r"Link2Stk\('(\w+)'\)") # ETFs: javascript:Link2Stk('0050');
+_stock_script = re.compile(r"GenLink2stk\('AS(\d+)'") # stocks: GenLink2stk('AS2330','台積電');
+_revenue_month = re.compile(r"\d+/\d+") # ROC year/month, e.g. 108/01
+
+def _text(cell) -> str:
+    return cell.text_content().strip()
+
+def extract_broker_rows(page: str) -> dict[str, list[str]]:
+    """
+    Rows of the buy and sell tables of a broker page (zgb0.djhtm), sell rows in reverse order:
+    `stock_id`, `buy`, `sell` and `volume` (net). Pages of brokers without trades have no rows.
+    """
+    tables = _broker_tables(html.fromstring(page))
+    if len(tables) < 2:
+        raise ValueError(f"expected the buy and sell tables, found {len(tables)} tables")
+
+    columns = {"stock_id": [], "buy": [], "sell": [], "volume": []}
+    for table, step in zip(tables[:2], (1, -1)):
+        for row in _rows(table)[::step]:
+            cells = _cells(row)
+            if len(cells) != 4:
+                continue
+            stock = _etf_link.search(" ".join(_links(cells[0]))) or _stock_script.search(_text(cells[0]))
+            if stock is None: # title and header rows, or the no-data notice
+                continue
+            columns["stock_id"].append(stock.group(1))
+            columns["buy"].append(_text(cells[1]))
+            columns["sell"].append(_text(cells[2]))
+            columns["volume"].append(_text(cells[3]))
+    return columns
+
+def extract_revenue_rows(page: str) -> dict[str, list[str]]:
+    """
+    Monthly revenue of a stock revenue page (zch_{stock_id}.djhtm): `date` (ROC year/month) and `revenue`.
+    """
+    tables = _revenue_table(html.fromstring(page))
+    if not tables:
+        raise ValueError("revenue table oMainTable not found")
+
+    columns = {"date": [], "revenue": []}
+    for row in _rows(tables[0]):
+        cells = _cells(row)
+        if len(cells) < 2:
+            continue
+        month = _text(cells[0])
+        if _revenue_month.fullmatch(month):
+            columns["date"].append(month)
+            columns["revenue"].append(_text(cells[1]))
+    return columns
+
+def extract_isin_rows(page: str) -> list[list[str]]:
+    """
+    Rows of the 7 columns of an ISIN listing page (isin.twse.com.tw C_public.jsp), header and section
+    rows excluded. The page is split into sections by single-cell title rows ("股票", "ETF", ...), and empty
+    cells are filled as `read_html` followed by `ffill` did: from the row above, or with the title of the
+    section for its first row, which is how the remark column gets the asset type. The fill never crosses
+    pages; cells of rows before the first section stay empty.
+    """
+    rows = _isin_rows(html.fromstring(page))
+    if not rows:
+        raise ValueError("ISIN listing table not found")
+
+    values, previous = [], [""] * 7
+    for row in rows:
+        cells = _cells(row)
+        if len(cells) == 1:
+            previous = [_text(cells[0])] * 7
+        elif len(cells) == 7:
+            previous = [_text(cell) or fill for cell, fill in zip(cells, previous)]
+            values.append(previous)
+    return values[1:] # header
+
+if __name__ == "__main__":
+    import json
+    import time
+    from io import StringIO
+    from pathlib import Path
+
+    import pandas as pd
+    import zstandard
+
+    from config.settings import HTTP_CACHE_DIR
+    from util.parse_pool import decode_content
+
+    def read_html_broker(page: str):
+        dfs = pd.read_html(StringIO(page), extract_links="all", attrs={"class":"t0"}, skiprows=1)
+        return pd.concat([dfs[0].drop(0), dfs[1].drop(0).iloc[::-1]], ignore_index=True)
+
+    def read_html_revenue(page: str):
+        return pd.read_html(StringIO(page), attrs={'id':'oMainTable'}, skiprows=6)[0][[0,1]]
+
+    def read_html_isin(page: str):
+        return pd.read_html(StringIO(page), skiprows=1)[0].ffill()
+
+    page_types = { # url fragment: (read_html path, lxml path)
+        "zgb0.djhtm": (read_html_broker, extract_broker_rows),
+        "/zch_": (read_html_revenue, extract_revenue_rows),
+        "C_public.jsp": (read_html_isin, extract_isin_rows),
+    }
+    pages = {fragment: [] for fragment in page_types}
+    for path in Path(HTTP_CACHE_DIR).glob("*/*.zst"):
+        meta, content = zstandard.ZstdDecompressor().decompress(path.read_bytes()).split(b"\n", 1)
+        meta = json.loads(meta)
+        for fragment in page_types:
+            if fragment in meta["request_url"]:
+                pages[fragment].append(decode_content(content, meta["encoding"]))
+
+    for fragment, (read_html_path, lxml_path) in page_types.items():
+        if not pages[fragment]:
+            print(f"{fragment}: no recorded pages in {HTTP_CACHE_DIR}")
+            continue
+        timings = {}
+        for name, extract in [("read_html", read_html_path), ("lxml", lxml_path)]:
+            start = time.perf_counter()
+            for page in pages[fragment]:
+                try:
+                    extract(page)
+                except Exception:
+                    pass
+            timings[name] = time.perf_counter() - start
+        print(f"{fragment}: {len(pages[fragment])} pages | read_html {timings['read_html']:.2f}s | "
+              f"lxml {timings['lxml']:.2f}s | {timings['read_html'] / timings['lxml']:.1f}x faster")
+
+    for page in pages["C_public.jsp"]: # the section titles filled in are the only source of the asset type
+        expected = read_html_isin(page)
+        expected = expected[expected.nunique(axis=1) > 1].iloc[:, [4, 6]].fillna("")
+        extracted = [[row[4], row[6]] for row in extract_isin_rows(page)]
+        assert expected.values.tolist() == extracted, "industry or asset types of an ISIN page differ from read_html"
+    if pages["C_public.jsp"]:
+        print(f"C_public.jsp: industry and asset types of {len(pages['C_public.jsp'])} pages match read_html")
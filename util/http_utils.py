@@ -0,0 +1,319 @@
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+from requests import Session, Response
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, Timeout, ChunkedEncodingError
+
+from config.settings import (USER_AGENT, HOST_MAX_CONCURRENCY, DEFAULT_HOST_MAX_CONCURRENCY,
+                             HOST_RATE_LIMITS, DEFAULT_HOST_RATE_LIMIT, RETRY_MAX_ATTEMPTS, RETRY_WAIT_SECONDS,
+                             RETRY_STATUS, HTTP_TIMEOUT, CIRCUIT_BREAKER)
+from util.response_cache import response_cache
+from util.proxy_utils import proxy_pool
+
+_host_semaphores: dict[str, threading.BoundedSemaphore] = {}
+_host_semaphores_lock = threading.Lock()
+
+def host_key(url: str) -> str:
+    """
+    Map a URL to its configured host key (longest matching domain suffix in `HOST_MAX_CONCURRENCY`
+    or `HOST_RATE_LIMITS`), e.g. `https://www.twse.com.tw/...` and `https://isin.twse.com.tw/...`
+    both map to `twse.com.tw`. Unconfigured hosts map to their own hostname.
+    """
+    hostname = urlsplit(url).hostname or ""
+    matches = [key for key in {*HOST_MAX_CONCURRENCY, *HOST_RATE_LIMITS}
+               if hostname == key or hostname.endswith(f".{key}")]
+    return max(matches, key=len) if matches else hostname
+
+def host_semaphore(key: str) -> threading.BoundedSemaphore:
+    """
+    Process-wide semaphore bounding the number of in-flight requests to one host.
+    """
+    with _host_semaphores_lock:
+        if key not in _host_semaphores:
+            limit = HOST_MAX_CONCURRENCY.get(key, DEFAULT_HOST_MAX_CONCURRENCY)
+            _host_semaphores[key] = threading.BoundedSemaphore(limit)
+        return _host_semaphores[key]
+
+class TokenBucket:
+    """
+    Rate limiter of one host: tokens refill at `rate` per second up to `burst`, one token per request.
+
+    `reserve` takes a token immediately and returns how long the caller must wait before sending,
+    so blocking callers sleep on it (`acquire`) and async callers can `await asyncio.sleep` on it instead.
+    Reservations queue up in order, so concurrent callers are spaced `1 / rate` apart.
+    """
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.waited = 0.
+        self.max_wait = 0.
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = max(0., -self._tokens / self.rate)
+
+            self.requests += 1
+            self.waited += wait
+            self.max_wait = max(self.max_wait, wait)
+            return wait
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests, self.waited, self.max_wait = 0, 0., 0.
+
+_host_buckets: dict[str, TokenBucket] = {}
+_host_buckets_lock = threading.Lock()
+
+def host_bucket(key: str) -> TokenBucket:
+    """
+    Process-wide token bucket limiting the request rate to one host.
+    """
+    with _host_buckets_lock:
+        if key not in _host_buckets:
+            limit = HOST_RATE_LIMITS.get(key, DEFAULT_HOST_RATE_LIMIT)
+            _host_buckets[key] = TokenBucket(limit["rate"], limit["burst"])
+        return _host_buckets[key]
+
+def rate_limit_stats() -> dict[str, dict]:
+    """
+    Requests, total and max wait (in seconds) per host since the last `report_rate_limit_stats`.
+    """
+    with _host_buckets_lock:
+        return {key: {"requests": bucket.requests, "waited": bucket.waited, "max_wait": bucket.max_wait}
+                for key, bucket in _host_buckets.items() if bucket.requests}
+
+def report_rate_limit_stats():
+    """
+    Print and reset the wait-time statistics of the host rate limiters.
+    """
+    for key, stats in rate_limit_stats().items():
+        print(f"[rate limit] {key}: {stats['requests']} requests, "
+              f"waited {stats['waited']:.1f}s in total, {stats['max_wait']:.1f}s at most")
+    with _host_buckets_lock:
+        for bucket in _host_buckets.values():
+            bucket.reset_stats()
+
+RETRY_EXCEPTIONS = (ConnectionError, Timeout, ChunkedEncodingError)
+
+class CircuitOpenError(ConnectionError):
+    """
+    Raised without sending a request while the circuit breaker of the host is open.
+    """
+
+class CircuitBreaker:
+    """
+    Failure detector of one host. After `failures` failed requests in a row the circuit opens and
+    requests fail fast with `CircuitOpenError`; after `cooldown` seconds one trial request is let
+    through (half-open), which closes the circuit on success or reopens it on failure.
+    """
+    def __init__(self, key: str, failures: int, cooldown: float):
+        self.key = key
+        self.failures = failures
+        self.cooldown = cooldown
+        self._consecutive_failures = 0
+        self._opened_at: float | None = None
+        self._trial = False
+        self._lock = threading.Lock()
+        self.trips = 0
+        self.rejected = 0
+
+    def check(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if self._trial or time.monotonic() - self._opened_at < self.cooldown:
+                self.rejected += 1
+                raise CircuitOpenError(f"{self.key} failed {self._consecutive_failures} requests in a row, "
+                                       f"circuit open for {self.cooldown}s")
+            self._trial = True
+
+    def record(self, ok: bool):
+        with self._lock:
+            if ok:
+                self._consecutive_failures = 0
+                self._opened_at = None
+            else:
+                self._consecutive_failures += 1
+                if self._trial or (self._opened_at is None and self._consecutive_failures >= self.failures):
+                    self._opened_at = time.monotonic()
+                    self.trips += 1
+            self._trial = False
+
+    def abandon(self):
+        """
+        End a request without an outcome for the breaker (throttled or cancelled); a half-open trial is given up.
+        """
+        with self._lock:
+            self._trial = False
+
+_host_breakers: dict[str, CircuitBreaker] = {}
+_host_breakers_lock = threading.Lock()
+
+def host_breaker(key: str) -> CircuitBreaker:
+    """
+    Process-wide circuit breaker of one host.
+    """
+    with _host_breakers_lock:
+        if key not in _host_breakers:
+            _host_breakers[key] = CircuitBreaker(key, CIRCUIT_BREAKER["failures"], CIRCUIT_BREAKER["cooldown"])
+        return _host_breakers[key]
+
+def backoff_delay(attempt: int, retry_after: str | None = None) -> float:
+    """
+    Wait before retrying a failed `attempt` (1-based): a `Retry-After` of the server in seconds if given,
+    else a random delay up to `RETRY_WAIT_SECONDS * 2 ** (attempt - 1)` (full jitter, so clients
+    failing together do not retry together).
+    """
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    return random.uniform(0, RETRY_WAIT_SECONDS * 2 ** (attempt - 1))
+
+class ScraperSession(Session):
+    """
+    `requests.Session` used by all scrapers. Requests to the same host share a process-wide
+    concurrency limit and token bucket, so concurrent scrapers cannot flood one data provider.
+    Failed requests (connection errors, timeouts and `RETRY_STATUS` responses) are retried with backoff,
+    and each host has a circuit breaker, so a provider that is down fails fast instead of using up
+    the retries of every pending request. Each host key gets its own `HTTPAdapter`, whose connection pool holds as many keep-alive
+    connections as the host's concurrency limit, so concurrent requests do not churn connections.
+    Responses go through the raw response cache when `HTTP_CACHE_MODE` is set (see util/response_cache.py),
+    and the outcome of requests sent through a pooled proxy is reported to the proxy pool (see util/proxy_utils.py).
+    """
+    def __init__(self):
+        super().__init__()
+        self.headers.update({"user-agent": USER_AGENT})
+        self.host_adapters: dict[str, HTTPAdapter] = {}
+        self._host_adapters_lock = threading.Lock()
+
+    def get_adapter(self, url: str) -> HTTPAdapter:
+        key = host_key(url)
+        with self._host_adapters_lock:
+            if key not in self.host_adapters:
+                pool_size = HOST_MAX_CONCURRENCY.get(key, DEFAULT_HOST_MAX_CONCURRENCY)
+                # pool_connections: hosts kept per key, e.g. www.twse.com.tw and isin.twse.com.tw
+                self.host_adapters[key] = HTTPAdapter(pool_connections=8, pool_maxsize=pool_size)
+            return self.host_adapters[key]
+
+    def close(self):
+        super().close()
+        with self._host_adapters_lock:
+            for adapter in self.host_adapters.values():
+                adapter.close()
+            self.host_adapters.clear()
+
+    def request(self, method: str, url: str, *args, **kwargs) -> Response:
+        if response_cache.mode != "off":
+            cache_request = response_cache.prepare(method, url, kwargs.get("params"), kwargs.get("data"), kwargs.get("json"))
+            if response_cache.mode == "replay":
+                return response_cache.load(cache_request)
+
+        kwargs.setdefault("timeout", HTTP_TIMEOUT)
+        key = host_key(url)
+        breaker = host_breaker(key)
+        for attempt in range(1, RETRY_MAX_ATTEMPTS + 1):
+            breaker.check()
+            try:
+                response = self._send_once(key, method, url, *args, **kwargs)
+            except RETRY_EXCEPTIONS as e:
+                breaker.record(False)
+                if attempt == RETRY_MAX_ATTEMPTS:
+                    raise
+                print(f"[retry] {method} {url} attempt {attempt} failed with {e!r}")
+                time.sleep(backoff_delay(attempt))
+                continue
+            except Exception: # not a failure of the host
+                breaker.record(True)
+                raise
+
+            retryable = response.status_code in RETRY_STATUS
+            breaker.record(not retryable)
+            if not retryable or attempt == RETRY_MAX_ATTEMPTS:
+                break
+            print(f"[retry] {method} {url} attempt {attempt} failed with status {response.status_code}")
+            time.sleep(backoff_delay(attempt, response.headers.get("Retry-After")))
+
+        if response_cache.mode == "record":
+            response_cache.store_response(cache_request, response)
+        return response
+
+    def _send_once(self, key: str, method: str, url: str, *args, **kwargs) -> Response:
+        proxy = (kwargs.get("proxies") or {}).get(urlsplit(url).scheme)
+        with host_semaphore(key):
+            host_bucket(key).acquire()
+            start = time.monotonic()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except Exception:
+                if proxy:
+                    proxy_pool.report(proxy, False)
+                raise
+        if proxy:
+            proxy_pool.report(proxy, response.status_code == 200, time.monotonic() - start)
+        return response
+
+_session: ScraperSession | None = None
+_session_lock = threading.Lock()
+_reported_connections: dict[str, tuple[int, int]] = {}
+
+def get_session() -> ScraperSession:
+    """
+    Process-wide session shared by all scrapers, so keep-alive connections (and their TLS handshakes)
+    are reused across dates, scrapers and worker threads.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = ScraperSession()
+        return _session
+
+def connection_stats() -> dict[str, dict]:
+    """
+    Requests and newly opened connections per host key since the last `report_connection_stats`.
+    """
+    if _session is None:
+        return {}
+    stats = {}
+    with _session._host_adapters_lock:
+        for key, adapter in _session.host_adapters.items():
+            pools = adapter.poolmanager.pools
+            requests = sum(pools[pool_key].num_requests for pool_key in pools.keys())
+            connections = sum(pools[pool_key].num_connections for pool_key in pools.keys())
+            reported_requests, reported_connections = _reported_connections.get(key, (0, 0))
+            requests, connections = requests - reported_requests, connections - reported_connections
+            if requests:
+                stats[key] = {"requests": requests, "connections": connections,
+                              "reuse": 1 - connections / requests}
+    return stats
+
+def report_connection_stats():
+    """
+    Print and reset the connection reuse of the shared session, and the hosts whose circuit breaker opened.
+    """
+    for key, stats in connection_stats().items():
+        print(f"[connections] {key}: {stats['requests']} requests over {stats['connections']} new connections "
+              f"({stats['reuse']:.0%} reused)")
+        reported_requests, reported_connections = _reported_connections.get(key, (0, 0))
+        _reported_connections[key] = (reported_requests + stats["requests"],
+                                      reported_connections + stats["connections"])
+    with _host_breakers_lock:
+        for breaker in _host_breakers.values():
+            if breaker.trips:
+                print(f"[circuit breaker] {breaker.key}: opened {breaker.trips} times, "
+                      f"{breaker.rejected} requests failed fast")
+            breaker.trips, breaker.rejected = 0, 0
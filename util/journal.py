@@ -0,0 +1,97 @@
+"""
+Checkpoint journal (`ingestion_journal`): the status of every work unit a task runner schedules,
+e.g. one trading date of a daily task.
+
+A unit is registered `pending`, becomes `running` when its scrape starts, and `done` or `failed`
+once its rows are committed (or its scrape raised). Units left pending, running or failed by an
+interrupted or partially failed run are returned by `get_unfinished_units`, so the next run redoes
+exactly those instead of only resuming from the latest stored date.
+"""
+import pandas as pd
+
+from config.settings import JOURNAL_MAX_ATTEMPTS
+from util.db_pool import db_pool
+from util.catalog import table_exists
+
+JOURNAL_TABLE = "ingestion_journal"
+
+def unit_key(date: pd.Timestamp) -> str:
+    """
+    Journal key of a date unit.
+    """
+    return date.strftime("%Y-%m-%d")
+
+def add_pending_units(table_name: str, keys: list[str]):
+    """
+    Register units about to be scheduled. Units already in the journal keep their status and attempts.
+    """
+    if not keys:
+        return
+    with db_pool.connection() as conn:
+        conn.execute(f"""
+            INSERT INTO {JOURNAL_TABLE} (table_name, unit_key, status, attempts)
+            SELECT %s, unnest(%s::varchar[]), 'pending', 0
+            ON CONFLICT (table_name, unit_key) DO NOTHING
+        """, (table_name, list(keys)))
+
+def start_unit(table_name: str, key: str):
+    with db_pool.connection() as conn:
+        conn.execute(f"""
+            INSERT INTO {JOURNAL_TABLE} (table_name, unit_key, status, attempts, started_at)
+            VALUES (%s, %s, 'running', 1, clock_timestamp())
+            ON CONFLICT (table_name, unit_key) DO UPDATE SET
+                status = 'running', attempts = {JOURNAL_TABLE}.attempts + 1,
+                started_at = EXCLUDED.started_at, finished_at = NULL, error = NULL
+        """, (table_name, key))
+
+def finish_unit(table_name: str, key: str, error: str | None = None):
+    """
+    Mark a unit done, or failed with `error`. Called once the unit's rows are committed,
+    or right away if its scrape raised.
+    """
+    status = "done" if error is None else "failed"
+    with db_pool.connection() as conn:
+        conn.execute(f"""
+            UPDATE {JOURNAL_TABLE} SET status = %s, finished_at = clock_timestamp(), error = %s
+            WHERE table_name = %s AND unit_key = %s
+        """, (status, error[:512] if error else None, table_name, key))
+
+def get_unfinished_units(table_name: str, max_attempts: int = JOURNAL_MAX_ATTEMPTS) -> list[str]:
+    """
+    Keys of the units of `table_name` that are not done, excluding those already attempted `max_attempts` times.
+    """
+    with db_pool.connection() as conn:
+        if not table_exists(conn, JOURNAL_TABLE): # not created yet (`--plan` on a new database)
+            return []
+        rows = conn.execute(f"""
+            SELECT unit_key FROM {JOURNAL_TABLE}
+            WHERE table_name = %s AND status <> 'done' AND attempts < %s
+            ORDER BY unit_key
+        """, (table_name, max_attempts)).fetchall()
+    return [key for key, in rows]
+
+def get_journal(table_name: str, status: str | None = None) -> pd.DataFrame:
+    """
+    Journal rows of a table, optionally filtered by status, with the duration of each finished attempt.
+    """
+    query = (f"SELECT unit_key, status, attempts, started_at, finished_at, error "
+             f"FROM {JOURNAL_TABLE} WHERE table_name = %s")
+    params = [table_name]
+    if status is not None:
+        query += " AND status = %s"
+        params.append(status)
+    with db_pool.connection() as conn:
+        rows = conn.execute(query + " ORDER BY unit_key", params).fetchall()
+    df = pd.DataFrame(rows, columns=["unit_key", "status", "attempts", "started_at", "finished_at", "error"])
+    df["duration"] = pd.to_datetime(df["finished_at"]) - pd.to_datetime(df["started_at"])
+    return df
+
+if __name__ == "__main__":
+
+    with db_pool.connection() as conn:
+        rows = conn.execute(f"""
+            SELECT table_name, status, count(*), max(attempts) FROM {JOURNAL_TABLE}
+            GROUP BY table_name, status ORDER BY table_name, status
+        """).fetchall()
+    for table_name, status, n_units, max_attempts in rows:
+        print(f"{table_name:<24} {status:<8} {n_units:>6} units (max attempts {max_attempts})")
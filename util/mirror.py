@@ -0,0 +1,175 @@
+"""
+Local columnar mirror of the model tables, for analytical reads off the database.
+
+Each table is mirrored to `MIRROR_DIR/<table>/` as Parquet files, partitioned by year for dated tables
+(`year=2024/part-20240102-20240131.parquet`). `_state.json` records the date range and row count of every
+file and the database time of the last export, so `refresh_mirror` only re-exports the files whose dates
+were (re)loaded since then, or whose row count no longer matches the ingestion catalog (dates deleted).
+"""
+import json
+import os
+from pathlib import Path
+from typing import Type
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy.orm import DeclarativeBase
+
+from config.settings import MIRROR_DIR
+from util.catalog import get_watermark, get_updated_at, get_loaded_dates
+from util.db_pool import db_pool
+from util.db_utils import ModelFrameMapper
+
+STATE_FILE = "_state.json"
+
+def _table_dir(model: Type[DeclarativeBase], mirror_dir: str) -> Path:
+    return Path(mirror_dir) / model.__tablename__
+
+def _load_state(table_dir: Path) -> dict:
+    state_path = table_dir / STATE_FILE
+    if not state_path.exists():
+        return {"exported_at": None, "files": {}}
+    with open(state_path) as f:
+        return json.load(f)
+
+def _save_state(table_dir: Path, state: dict):
+    tmp_path = table_dir / f"{STATE_FILE}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, table_dir / STATE_FILE)
+
+def _db_now() -> pd.Timestamp:
+    with db_pool.connection() as conn:
+        return pd.Timestamp(conn.execute("SELECT now()::timestamp").fetchone()[0])
+
+def _export_query(model: Type[DeclarativeBase], query_str: str, path: Path) -> int:
+    """
+    Stream a query result into one Parquet file, written atomically. Returns the number of rows.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".parquet.tmp")
+    writer = None
+    n_rows = 0
+    try:
+        for chunk in ModelFrameMapper(model).iter_sql(query_str):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema, compression="zstd")
+            writer.write_table(table)
+            n_rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if n_rows == 0:
+        tmp_path.unlink(missing_ok=True)
+        path.unlink(missing_ok=True)
+    else:
+        os.replace(tmp_path, path)
+    return n_rows
+
+def _refresh_dated(model: Type[DeclarativeBase], table_dir: Path, state: dict):
+    table_name = model.__tablename__
+    exported_at = pd.Timestamp(state["exported_at"]) if state["exported_at"] else None
+    loaded = get_loaded_dates(table_name)
+    dirty_dates = loaded["date"] if exported_at is None else loaded.loc[loaded["loaded_at"] > exported_at, "date"]
+
+    # a file is stale if some of its dates were reloaded, or if its row count no longer matches
+    # the catalog: dates deleted since the export (e.g. by a `replace` write) are not "loaded"
+    files = {name: (pd.Timestamp(entry[0]), pd.Timestamp(entry[1])) for name, entry in state["files"].items()}
+    file_rows = {name: entry[2] if len(entry) > 2 else None for name, entry in state["files"].items()}
+    stale_files = {name for name, (lo, hi) in files.items()
+                   if dirty_dates.between(lo, hi).any()
+                   or file_rows[name] != loaded.loc[loaded["date"].between(lo, hi), "row_count"].sum()}
+    covered = pd.Series(False, index=dirty_dates.index)
+    for lo, hi in files.values():
+        covered |= dirty_dates.between(lo, hi)
+
+    # dates outside existing files form new files, one per month; a file of the same month
+    # ending before them is extended instead, so daily refreshes do not pile up small files
+    new_files = {}
+    uncovered = dirty_dates[~covered]
+    for period, dates in uncovered.groupby(uncovered.dt.to_period("M")):
+        lo, hi = dates.min(), dates.max()
+        for name, (file_lo, file_hi) in files.items():
+            if file_lo.to_period("M") == period and file_hi < lo and name not in stale_files:
+                lo = file_lo
+                (table_dir / name).unlink(missing_ok=True)
+                state["files"].pop(name)
+                break
+        new_files[f"year={period.year}/part-{lo:%Y%m%d}-{hi:%Y%m%d}.parquet"] = (lo, hi)
+
+    for name, (lo, hi) in {**{name: files[name] for name in stale_files}, **new_files}.items():
+        query_str = (f"SELECT * FROM {table_name} "
+                     f"WHERE date >= '{lo:%Y-%m-%d %H:%M:%S}' AND date <= '{hi:%Y-%m-%d %H:%M:%S}'")
+        n_rows = _export_query(model, query_str, table_dir / name)
+        print(f"[mirror] {table_name}/{name}: {n_rows} rows")
+        if n_rows:
+            state["files"][name] = [lo.isoformat(), hi.isoformat(), n_rows]
+        else:
+            state["files"].pop(name, None)
+
+def refresh_mirror(model: Type[DeclarativeBase], mirror_dir: str = MIRROR_DIR):
+    """
+    Bring the mirror of a model table up to date with the database.
+    """
+    table_dir = _table_dir(model, mirror_dir)
+    table_dir.mkdir(parents=True, exist_ok=True)
+    state = _load_state(table_dir)
+    export_started = _db_now()
+
+    if "date" in model.__table__.columns:
+        _refresh_dated(model, table_dir, state)
+    else:
+        updated_at = get_updated_at(model.__tablename__)
+        exported_at = pd.Timestamp(state["exported_at"]) if state["exported_at"] else None
+        if exported_at is None or (updated_at is not None and updated_at > exported_at):
+            n_rows = _export_query(model, f"SELECT * FROM {model.__tablename__}", table_dir / "data.parquet")
+            print(f"[mirror] {model.__tablename__}/data.parquet: {n_rows} rows")
+            state["files"] = {"data.parquet": None} if n_rows else {}
+
+    state["exported_at"] = export_started.isoformat()
+    _save_state(table_dir, state)
+
+def mirror_is_fresh(model: Type[DeclarativeBase], mirror_dir: str = MIRROR_DIR) -> bool:
+    """
+    True if the mirror was exported after the last catalogued write to the table.
+    """
+    state = _load_state(_table_dir(model, mirror_dir))
+    if state["exported_at"] is None:
+        return False
+    if "date" in model.__table__.columns:
+        updated_at = get_watermark(model.__tablename__)["updated_at"]
+    else:
+        updated_at = get_updated_at(model.__tablename__)
+    return updated_at is None or updated_at <= pd.Timestamp(state["exported_at"])
+
+def read_mirror(model: Type[DeclarativeBase], query_str: str = None, mirror_dir: str = MIRROR_DIR) -> pd.DataFrame:
+    """
+    Run `query_str` (which refers to the model's table by name) with DuckDB on the mirror when it is fresh,
+    otherwise fall back to reading from the database.
+    """
+    table_name = model.__tablename__
+    query_str = query_str or f"SELECT * FROM {table_name}"
+
+    if mirror_dir is None or not mirror_is_fresh(model, mirror_dir):
+        print(f"[mirror] {table_name} is not up to date, reading from database")
+        return ModelFrameMapper(model).read_sql(query_str)
+
+    table_dir = _table_dir(model, mirror_dir)
+    if not _load_state(table_dir)["files"]: # empty table, nothing to read from
+        return ModelFrameMapper(model).read_sql(query_str)
+
+    with duckdb.connect() as con:
+        con.execute(f"CREATE VIEW {table_name} AS "
+                    f"SELECT * FROM read_parquet('{table_dir}/**/*.parquet', hive_partitioning = false)")
+        return con.execute(query_str).df()
+
+if __name__ == "__main__":
+
+    from models import StockPrice
+
+    refresh_mirror(StockPrice)
+    print(read_mirror(StockPrice, "SELECT stock_id, count(*) AS n FROM stock_price GROUP BY stock_id ORDER BY n DESC LIMIT 5"))
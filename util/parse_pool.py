@@ -0,0 +1,134 @@
+"""
+Fetch/parse stages for scrapers that download many pages per run.
+
+Fetching is I/O-bound and runs on threads; parsing (`pd.read_html` and friends) is CPU-bound and runs
+on a process-wide `ProcessPoolExecutor`, which receives raw response bytes. Parse functions must be
+module-level so they can be pickled. Both stages record their busy time, and `report_stage_stats`
+prints how much of each stage's capacity was used, to tune `FETCH_WORKERS` and `PARSE_POOL_SIZE`.
+"""
+import atexit
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Iterable
+
+from requests.compat import chardet
+
+from config.settings import FETCH_WORKERS, PARSE_POOL_SIZE
+
+_parse_pool: ProcessPoolExecutor | None = None
+_parse_pool_lock = threading.Lock()
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    """
+    Process-wide parse pool, created on first use.
+    """
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            # spawn: the parent already runs DB-pool and scraping threads, which fork does not copy safely
+            _parse_pool = ProcessPoolExecutor(max_workers=PARSE_POOL_SIZE,
+                                              mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(_parse_pool.shutdown, cancel_futures=True)
+        return _parse_pool
+
+def decode_content(content: bytes, encoding: str | None) -> str:
+    """
+    Decode a response body like `Response.text`, in the parsing process.
+    """
+    encoding = encoding or chardet.detect(content)["encoding"] or "utf-8"
+    return content.decode(encoding, errors="replace")
+
+class StageStats:
+    """
+    Busy time of the fetch and parse stages of one scraper, accumulated over its runs.
+    Utilization is busy time over the capacity of the stage (wall time x workers).
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.wall = 0.
+        self.items = 0
+        self.busy = {"fetch": 0., "parse": 0.}
+        self.workers = {"fetch": 0, "parse": 0}
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.busy[stage] += seconds
+
+    def add_run(self, wall: float, items: int, fetch_workers: int, parse_workers: int):
+        with self._lock:
+            self.wall += wall
+            self.items += items
+            self.workers = {"fetch": fetch_workers, "parse": parse_workers}
+
+    def utilization(self, stage: str) -> float:
+        capacity = self.wall * self.workers[stage]
+        return self.busy[stage] / capacity if capacity else 0.
+
+    def __str__(self) -> str:
+        return (f"[{self.name}] {self.items} pages in {self.wall:.1f}s | "
+                f"fetch: busy {self.busy['fetch']:.1f}s, {self.utilization('fetch'):.0%} of {self.workers['fetch']} threads | "
+                f"parse: busy {self.busy['parse']:.1f}s, {self.utilization('parse'):.0%} of {self.workers['parse']} processes")
+
+_stage_stats: dict[str, StageStats] = {}
+_stage_stats_lock = threading.Lock()
+
+def get_stage_stats(name: str) -> StageStats:
+    with _stage_stats_lock:
+        if name not in _stage_stats:
+            _stage_stats[name] = StageStats(name)
+        return _stage_stats[name]
+
+def report_stage_stats():
+    """
+    Print and reset the stage statistics collected since the last report.
+    """
+    with _stage_stats_lock:
+        for stats in _stage_stats.values():
+            print(stats)
+        _stage_stats.clear()
+
+def timed_parse(parse: Callable, args: tuple) -> tuple[Any, float]:
+    """
+    Run `parse(*args)` in the parse pool, returning its result and duration.
+    """
+    start = time.perf_counter()
+    result = parse(*args)
+    return result, time.perf_counter() - start
+
+def fetch_and_parse(items: Iterable, fetch: Callable[[Any], tuple], parse: Callable[..., Any],
+                    stats_name: str, fetch_workers: int = FETCH_WORKERS) -> list:
+    """
+    Run `parse(*fetch(item))` for every item and return the results in input order.
+    `fetch` runs on `fetch_workers` threads and returns the (picklable) arguments of `parse`,
+    typically the raw response bytes; each is handed to the parse pool as soon as it arrives.
+    Exceptions of either stage propagate.
+    """
+    stats = get_stage_stats(stats_name)
+    parse_pool = get_parse_pool()
+    started = time.perf_counter()
+
+    def timed_fetch(item) -> tuple:
+        start = time.perf_counter()
+        try:
+            return fetch(item)
+        finally:
+            stats.add("fetch", time.perf_counter() - start)
+
+    items = list(items)
+    with ThreadPoolExecutor(max_workers=fetch_workers) as fetch_pool:
+        fetch_futures = {fetch_pool.submit(timed_fetch, item): i for i, item in enumerate(items)}
+        parse_futures = {}
+        for future in as_completed(fetch_futures):
+            parse_futures[fetch_futures[future]] = parse_pool.submit(timed_parse, parse, future.result())
+
+    results = []
+    for i in range(len(items)):
+        result, seconds = parse_futures[i].result()
+        stats.add("parse", seconds)
+        results.append(result)
+
+    stats.add_run(time.perf_counter() - started, len(items), fetch_workers, PARSE_POOL_SIZE)
+    return results
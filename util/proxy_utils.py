@@ -1,40 +1,220 @@
+"""
+Scored proxy pool, persisted to `PROXY_POOL_PATH` across runs.
+
+Every proxy keeps its success and failure counts and a moving average of its latency. `choose` picks
+proxies at random weighted by score (smoothed success rate over latency); proxies failing
+`PROXY_MAX_FAILURES` times in a row are evicted, and the pool is refilled from the source when it runs
+low, by the background revalidation thread and at most once per `PROXY_REFILL_SECONDS`. Proxies that
+failed validation or were evicted are not tested again for `PROXY_REJECT_SECONDS`. The source is sslproxies.org, or the local list `PROXY_LIST_FILE` (one `host:port` per line),
+which lets tests run against stand-in proxies. Outcomes are reported by `ScraperSession` for requests
+sent with `proxies=scraper.proxy`. The file is read on first use and written by the main process only,
+so parse-pool workers importing this module never touch it.
+"""
+import atexit
+import json
+import multiprocessing
+import os
 import random
+import threading
+import time
 import requests
 import pandas as pd
 from io import StringIO
+from pathlib import Path
 from tqdm import tqdm
 from concurrent.futures import ThreadPoolExecutor
 
-_working_proxies: list[str] = []
+from config.settings import (PROXY_POOL_PATH, PROXY_LIST_FILE, PROXY_TEST_URL, PROXY_MAX_FAILURES,
+                             PROXY_MIN_POOL, PROXY_REVALIDATE_SECONDS, PROXY_REFILL_SECONDS, PROXY_REJECT_SECONDS)
+
+LATENCY_SMOOTHING = 0.3 # weight of the latest latency in the moving average
+DEFAULT_LATENCY = 1.0 # seconds, assumed for proxies never measured
 
 def load_proxies() -> list[str]:
     response = requests.get('https://www.sslproxies.org/')
     df = pd.read_html(StringIO(response.text), attrs={"class":"table table-striped table-bordered"})[0]
     return (df['IP Address'].astype(str) + ":" + df['Port'].astype(str)).tolist()
 
-def test_proxy(proxy: str, test_url: str) -> bool:
+def load_proxy_file(path: str) -> list[str]:
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+def test_proxy(proxy: str, test_url: str) -> tuple[bool, float]:
+    """
+    Return whether `test_url` is reachable through `proxy`, and the latency of the attempt.
+    """
+    start = time.monotonic()
     try:
-        response = requests.get(test_url, proxies={"https": proxy})
-        if response.status_code == 200:
-            return proxy
+        response = requests.get(test_url, proxies={"http": proxy, "https": proxy}, timeout=10)
+        return response.status_code == 200, time.monotonic() - start
     except Exception:
-        return None
+        return False, time.monotonic() - start
+
+class ProxyPool:
+
+    def __init__(self, path: str = PROXY_POOL_PATH, list_file: str | None = PROXY_LIST_FILE,
+                 test_url: str = PROXY_TEST_URL):
+        self.path = Path(path)
+        self.list_file = list_file
+        self.test_url = test_url
+        self._lock = threading.RLock()
+        self._revalidating: threading.Thread | None = None
+        self._refill_requested = threading.Event()
+        self._refill_lock = threading.Lock()
+        self._last_refill = 0.
+        self._loaded = False
+        self.proxies: dict[str, dict] = {}
+        self.rejected: dict[str, float] = {} # proxy: time it failed validation or was evicted
+
+    def _load(self):
+        """
+        Read the pool from `path` on first use.
+        """
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            if self.path.exists():
+                with open(self.path) as f:
+                    state = json.load(f)
+                if "proxies" in state: # older files hold the proxies only
+                    self.proxies, self.rejected = state["proxies"], state["rejected"]
+                else:
+                    self.proxies = state
+
+    def save(self):
+        """
+        Write the pool to `path`; does nothing in child processes, whose copy of the pool may be stale.
+        """
+        if multiprocessing.parent_process() is not None:
+            return
+        with self._lock:
+            self._load()
+            tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump({"proxies": self.proxies, "rejected": self.rejected}, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def _reject(self, proxy: str):
+        self.proxies.pop(proxy, None)
+        self.rejected[proxy] = time.time()
+
+    def score(self, proxy: str) -> float:
+        stats = self.proxies[proxy]
+        success_rate = (stats["successes"] + 1) / (stats["successes"] + stats["failures"] + 2)
+        return success_rate / max(stats["latency"] or DEFAULT_LATENCY, 0.05)
 
-def get_working_proxies(test_url: str = "http://httpbin.org/ip") -> list[str]:
-    proxy_list = load_proxies()
-    with ThreadPoolExecutor() as executor:
-        results = list(tqdm(executor.map(lambda px: test_proxy(px, test_url), proxy_list), total=len(proxy_list), desc="Testing proxies"))
-    working = [proxy for proxy in results if proxy is not None]
-    global _working_proxies
-    _working_proxies = working
-    return working
+    def report(self, proxy: str, ok: bool, latency: float | None = None):
+        """
+        Record the outcome of one request through `proxy`; evict it after `PROXY_MAX_FAILURES` failures in a row.
+        """
+        with self._lock:
+            self._load()
+            stats = self.proxies.get(proxy)
+            if stats is None: # evicted meanwhile
+                return
+            stats["last_used"] = time.time()
+            if ok:
+                stats["successes"] += 1
+                stats["consecutive_failures"] = 0
+                if latency is not None:
+                    stats["latency"] = latency if stats["latency"] is None else \
+                        LATENCY_SMOOTHING * latency + (1 - LATENCY_SMOOTHING) * stats["latency"]
+            else:
+                stats["failures"] += 1
+                stats["consecutive_failures"] += 1
+                if stats["consecutive_failures"] >= PROXY_MAX_FAILURES:
+                    self._reject(proxy)
+
+    def validate(self, proxies: list[str]):
+        """
+        Test `proxies` against `test_url` and record the outcomes.
+        """
+        self._load()
+        with ThreadPoolExecutor() as executor:
+            results = list(tqdm(executor.map(lambda px: test_proxy(px, self.test_url), proxies),
+                                total=len(proxies), desc="Testing proxies"))
+        for proxy, (ok, latency) in zip(proxies, results):
+            self.report(proxy, ok, latency)
+        self.save()
+
+    def refill(self, force: bool = False):
+        """
+        Add the proxies of the source that are neither in the pool nor recently rejected, keeping only
+        those that pass validation. Does nothing within `PROXY_REFILL_SECONDS` of the last refill unless `force`.
+        """
+        with self._refill_lock: # callers arriving during a refill wait for it and then skip theirs
+            if not force and time.monotonic() - self._last_refill < PROXY_REFILL_SECONDS:
+                return
+            self._last_refill = time.monotonic()
+            self._load()
+
+            source = load_proxy_file(self.list_file) if self.list_file else load_proxies()
+            now = time.time()
+            with self._lock:
+                self.rejected = {proxy: at for proxy, at in self.rejected.items() if now - at < PROXY_REJECT_SECONDS}
+                new_proxies = [proxy for proxy in source if proxy not in self.proxies and proxy not in self.rejected]
+                for proxy in new_proxies:
+                    self.proxies[proxy] = {"successes": 0, "failures": 0, "consecutive_failures": 0,
+                                           "latency": None, "last_used": None}
+            # a new proxy failing its first test is rejected right away
+            with ThreadPoolExecutor() as executor:
+                results = list(executor.map(lambda px: test_proxy(px, self.test_url), new_proxies))
+            with self._lock:
+                for proxy, (ok, latency) in zip(new_proxies, results):
+                    if ok:
+                        self.report(proxy, ok, latency)
+                    else:
+                        self._reject(proxy)
+            self.save()
+
+    def choose(self) -> str:
+        """
+        Pick a proxy at random, weighted by score. An empty pool is refilled right away; a pool running
+        low is refilled by the revalidation thread, without blocking the caller.
+        """
+        self._load()
+        if not self.proxies:
+            self.refill()
+        elif len(self.proxies) < PROXY_MIN_POOL:
+            self._refill_requested.set()
+        with self._lock:
+            if not self.proxies:
+                raise RuntimeError("No working proxy available")
+            proxies = list(self.proxies)
+            return random.choices(proxies, weights=[self.score(proxy) for proxy in proxies])[0]
+
+    def start_revalidation(self, interval: float = PROXY_REVALIDATE_SECONDS):
+        """
+        Revalidate the pool every `interval` seconds on a daemon thread (once per process).
+        """
+        def loop():
+            while True:
+                if not self._refill_requested.wait(interval): # revalidate every `interval`, or refill on request
+                    with self._lock:
+                        proxies = list(self.proxies)
+                    self.validate(proxies)
+                self._refill_requested.clear()
+                if len(self.proxies) < PROXY_MIN_POOL:
+                    self.refill()
+
+        with self._lock:
+            if self._revalidating is None:
+                self._revalidating = threading.Thread(target=loop, name="proxy-revalidation", daemon=True)
+                self._revalidating.start()
+
+proxy_pool = ProxyPool()
+if multiprocessing.parent_process() is None:
+    atexit.register(lambda: proxy_pool.proxies and proxy_pool.save())
 
 def get_random_proxy() -> str:
-    global _working_proxies
-    if not _working_proxies:
-        _working_proxies = get_working_proxies()
-    return random.choice(_working_proxies)
+    proxy_pool.start_revalidation()
+    return proxy_pool.choose()
 
 if __name__ == "__main__":
-    print(load_proxies())
-    print(f"working: {len(get_working_proxies(test_url='wwwc.twse.com.tw'))}")
\ No newline at end of file
+
+    proxy_pool.refill(force=True)
+    ranked = sorted(proxy_pool.proxies, key=proxy_pool.score, reverse=True)
+    for proxy in ranked[:10]:
+        print(f"{proxy:<24} score {proxy_pool.score(proxy):.2f} {proxy_pool.proxies[proxy]}")
+    print(f"working: {len(ranked)}")
@@ -0,0 +1,105 @@
+"""
+On-disk cache of raw HTTP responses, so parsers can be rerun without downloading again.
+
+Responses are keyed by the SHA-256 of the method, the full URL with its query string and the request body,
+and stored zstd-compressed under `HTTP_CACHE_DIR/<key[:2]>/<key>.zst`. `HTTP_CACHE_MODE` selects:
+
+- `off`: no caching
+- `record`: requests go to the network, and successful responses are (re)written to the cache
+- `replay`: responses are served from the cache only; a request that is not cached raises `CacheMiss`
+
+Replayed responses skip the host rate limits, so a whole history can be reparsed at disk speed,
+and tests can run fully offline.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import zstandard
+from requests import Request, PreparedRequest, Response
+from requests.structures import CaseInsensitiveDict
+
+from config.settings import HTTP_CACHE_MODE, HTTP_CACHE_DIR
+
+CACHE_MODES = ("off", "record", "replay")
+
+class CacheMiss(LookupError):
+    pass
+
+class ResponseCache:
+
+    def __init__(self, mode: str = HTTP_CACHE_MODE, cache_dir: str = HTTP_CACHE_DIR):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"HTTP cache mode must be one of {CACHE_MODES}, not {mode!r}")
+        self.mode = mode
+        self.cache_dir = Path(cache_dir)
+        self.hits = 0
+        self.writes = 0
+
+    @staticmethod
+    def prepare(method: str, url: str, params: dict = None, data=None, json=None) -> PreparedRequest:
+        """
+        Build the request whose URL and body make up the cache key.
+        """
+        return Request(method.upper(), url, params=params, data=data, json=json).prepare()
+
+    @staticmethod
+    def key(request: PreparedRequest) -> str:
+        body = request.body or b""
+        if isinstance(body, str):
+            body = body.encode()
+        return hashlib.sha256(f"{request.method}\n{request.url}\n".encode() + body).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.zst"
+
+    def load(self, request: PreparedRequest) -> Response:
+        """
+        Return the cached response of `request`, or raise `CacheMiss`.
+        """
+        path = self._path(self.key(request))
+        if not path.exists():
+            raise CacheMiss(f"{request.method} {request.url} is not in the HTTP cache ({self.cache_dir})")
+
+        raw = zstandard.ZstdDecompressor().decompress(path.read_bytes())
+        meta, content = raw.split(b"\n", 1)
+        meta = json.loads(meta)
+
+        response = Response()
+        response.status_code = meta["status_code"]
+        response.headers = CaseInsensitiveDict(meta["headers"])
+        response.encoding = meta["encoding"]
+        response.url = meta["url"]
+        response.request = request
+        response._content = content
+        self.hits += 1
+        return response
+
+    def store(self, request: PreparedRequest, status_code: int, headers: dict, encoding: str | None,
+              url: str, content: bytes):
+        """
+        Write a response to the cache, atomically. Only successful responses are cached.
+        """
+        if status_code != 200:
+            return
+        path = self._path(self.key(request))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {"status_code": status_code, "headers": dict(headers), "encoding": encoding, "url": str(url),
+                "method": request.method, "request_url": request.url}
+        raw = json.dumps(meta, ensure_ascii=False).encode() + b"\n" + content
+        tmp_path = path.with_suffix(f".tmp{os.getpid()}")
+        tmp_path.write_bytes(zstandard.ZstdCompressor(level=10).compress(raw))
+        os.replace(tmp_path, path)
+        self.writes += 1
+
+    def store_response(self, request: PreparedRequest, response: Response):
+        self.store(request, response.status_code, response.headers, response.encoding, response.url, response.content)
+
+response_cache = ResponseCache()
+
+if __name__ == "__main__":
+
+    files = list(Path(HTTP_CACHE_DIR).glob("*/*.zst"))
+    size = sum(path.stat().st_size for path in files)
+    print(f"{HTTP_CACHE_DIR}: {len(files)} responses, {size / 2**20:.1f} MiB (mode: {HTTP_CACHE_MODE})")
@@ -0,0 +1,106 @@
+"""
+Parsing of ROC (Minguo) calendar dates, year 1 = 1912, as published by TWSE, TPEx and Fubon.
+
+All observed formats are detected per value: `108/01/02`, `1080102`, `108年01月02日`, and `108/01`
+(year/month, parsed as the first day of the month). Columns of dates repeat a handful of distinct
+values, so each distinct string is parsed once and the results are mapped back with integer codes;
+the conversion itself is integer arithmetic on NumPy arrays, without building date strings.
+
+Benchmark against the per-scraper regex/`pd.to_datetime` implementations it replaces:
+
+    python -m util.roc_date
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+ROC_YEAR_OFFSET = 1911
+
+_separated = re.compile(r"(\d{1,3})\s*[/年.-]\s*(\d{1,2})\s*(?:[/月.-]\s*(\d{1,2})\s*日?|月)?")
+_compact = re.compile(r"(\d{2,3})(\d{2})(\d{2})") # 1080102
+
+def _split_roc_date(value: str) -> tuple[int, int, int] | None:
+    value = value.strip()
+    match = _separated.fullmatch(value) or _compact.fullmatch(value)
+    if match is None:
+        return None
+    year, month, day = match.groups()
+    return int(year), int(month), int(day or 1)
+
+def roc_to_datetime(s: pd.Series, errors: str = "raise") -> pd.Series:
+    """
+    Convert a Series of ROC date strings to `datetime64[ns]`, keeping its index.
+    Missing values become NaT; unparseable strings raise `ValueError`, or become NaT with `errors="coerce"`.
+    """
+    s = pd.Series(s)
+    codes, uniques = pd.factorize(s.astype("string"), use_na_sentinel=True)
+
+    parts = np.zeros((len(uniques), 3), dtype=np.int64)
+    valid = np.ones(len(uniques), dtype=bool)
+    for i, value in enumerate(uniques):
+        split = _split_roc_date(value)
+        if split is None:
+            if errors != "coerce":
+                raise ValueError(f"Unparseable ROC date: {value!r}")
+            valid[i] = False
+        else:
+            parts[i] = split
+
+    years, months, days = parts[:, 0] + ROC_YEAR_OFFSET, parts[:, 1], parts[:, 2]
+    dates = ((years - 1970).astype("M8[Y]") + (months - 1).astype("m8[M]")).astype("M8[D]") + (days - 1).astype("m8[D]")
+    # out-of-range months and days (e.g. 108/02/30) roll over into another month
+    invalid = ~valid | (months < 1) | (months > 12) | (dates.astype("M8[M]").astype(np.int64) % 12 + 1 != months)
+    if errors != "coerce" and invalid.any():
+        raise ValueError(f"Invalid ROC date: {uniques[np.argmax(invalid)]!r}")
+
+    dates = np.append(dates.astype("M8[ns]"), np.datetime64("NaT", "ns")) # missing values have code -1
+    dates[:-1][invalid] = np.datetime64("NaT", "ns")
+    return pd.Series(dates[codes], index=s.index, name=s.name)
+
+if __name__ == "__main__":
+    import time
+
+    def legacy_slash(s: pd.Series): # StockSplit / StockCapReduction twse, StockDividend tpex
+        s_year = s.str.extract(r'(\d+)/(\d+)/(\d+)')[0].astype(int) + 1911
+        s_month_day = s.str.extract(r'\d+/(\d+)/(\d+)')
+        return pd.to_datetime(s_year.astype(str) + "-" + s_month_day[0] + "-" + s_month_day[1])
+
+    def legacy_compact(s: pd.Series): # StockSplit / StockCapReduction tpex
+        s_year = s.str[:3].astype(int) + 1911
+        return pd.to_datetime(s_year.astype(str) + "-" + s.str[3:5] + "-" + s.str[5:7])
+
+    def legacy_chinese(s: pd.Series): # StockDividend twse
+        s_year = s.str.extract(r'(\d+)年')[0].astype(int) + 1911
+        s_month_day = s.str.extract(r'(\d+)月(\d+)日')
+        return pd.to_datetime(s_year.astype(str) + "-" + s_month_day[0] + "-" + s_month_day[1])
+
+    def legacy_month(s: pd.Series): # StockRevenue
+        extracted = s.str.split('/', n=1, expand=True)
+        return pd.to_datetime((extracted[0].astype(int) + 1911).astype(str) + "-" + extracted[1] + "-01")
+
+    def legacy_index_price(s: pd.Series): # IndexPrice
+        s = s.str.strip().str.replace(r"^\d+", lambda x: str(int(x.group()) + 1911), regex=True)
+        return pd.to_datetime(s, format="%Y/%m/%d")
+
+    rng = np.random.default_rng(0)
+    days = pd.Series(pd.bdate_range("2000-01-01", "2024-12-31"))[rng.integers(0, 6500, 1_000_000)]
+    roc_years = (days.dt.year - 1911).astype(str)
+    samples = {
+        "108/01/02": (roc_years + days.dt.strftime("/%m/%d"), [legacy_slash, legacy_index_price]),
+        "1080102": (roc_years.str.zfill(3) + days.dt.strftime("%m%d"), [legacy_compact]),
+        "108年01月02日": (roc_years + days.dt.strftime("年%m月%d日"), [legacy_chinese]),
+        "108/01": (roc_years + days.dt.strftime("/%m"), [legacy_month]),
+    }
+    for fmt, (s, legacy_parsers) in samples.items():
+        s = s.reset_index(drop=True)
+        start = time.perf_counter()
+        parsed = roc_to_datetime(s)
+        roc_seconds = time.perf_counter() - start
+        for legacy in legacy_parsers:
+            start = time.perf_counter()
+            expected = legacy(s)
+            legacy_seconds = time.perf_counter() - start
+            assert (parsed.values == expected.values.astype("M8[ns]")).all()
+            print(f"{fmt:<14} {legacy.__name__:<20} {legacy_seconds:.2f}s | roc_to_datetime {roc_seconds:.2f}s | "
+                  f"{legacy_seconds / roc_seconds:.0f}x faster")